@@ -0,0 +1,126 @@
+import numpy as np
+
+class IVFIndex:
+    """Inverted-file ANN index over normalized embeddings, in plain NumPy
+
+    Vectors are clustered into `nlist` cells with spherical k-means; a query only
+    visits the `nprobe` cells whose centroids are closest. The index returns
+    candidate row positions and leaves exact scoring (and so `threshold`) to the
+    caller. Raising `nprobe` trades latency for recall.
+    """
+
+    def __init__(self, nlist=256, nprobe=16, iterations=10, train_size=50000, seed=0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.train_size = train_size
+        self.seed = seed
+        self.centroids = None
+        self.lists = []
+        self.assignments = np.empty(0, dtype=np.int32)
+
+    def __len__(self):
+        return sum(len(positions) for positions in self.lists)
+
+    def __copy__(self):
+        """A copy whose add/delete leave this index untouched; cells are replaced, not mutated, so arrays are shared"""
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        clone.lists = list(self.lists)
+        clone.assignments = self.assignments.copy()
+        return clone
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _assign(self, vectors, chunk_size=65536):
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), chunk_size):
+            block = vectors[start:start + chunk_size]
+            assignments[start:start + chunk_size] = np.argmax(block @ self.centroids.T, axis=1)
+        return assignments
+
+    def train(self, vectors):
+        rng = np.random.default_rng(self.seed)
+        vectors = self._normalize(np.asarray(vectors, dtype=np.float32))
+        nlist = min(self.nlist, len(vectors))
+        sample = vectors
+        if len(vectors) > self.train_size:
+            sample = vectors[rng.choice(len(vectors), self.train_size, replace=False)]
+
+        self.centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            assignments = self._assign(sample)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=nlist)
+            empty = counts == 0
+            # Re-seed empty cells with random points so every cell stays useful
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            self.centroids = self._normalize(sums)
+        self.nlist = nlist
+        self.lists = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+
+    def build(self, vectors):
+        """Train on `vectors` and index them under positions 0..n-1"""
+        self.train(vectors)
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.add(np.arange(len(vectors)), vectors)
+        return self
+
+    def add(self, positions, vectors):
+        positions = np.asarray(positions, dtype=np.int64)
+        if not len(positions):
+            return
+        assignments = self._assign(self._normalize(np.asarray(vectors, dtype=np.float32)))
+        if positions.max() >= len(self.assignments):
+            grown = np.full(positions.max() + 1, -1, dtype=np.int32)
+            grown[:len(self.assignments)] = self.assignments
+            self.assignments = grown
+        self.delete(positions[self.assignments[positions] >= 0])
+        self.assignments[positions] = assignments
+        order = np.argsort(assignments, kind='stable')
+        cells, starts = np.unique(assignments[order], return_index=True)
+        for cell, group in zip(cells, np.split(positions[order], starts[1:])):
+            self.lists[cell] = np.concatenate([self.lists[cell], group])
+
+    def delete(self, positions):
+        for position in np.asarray(positions, dtype=np.int64):
+            if position >= len(self.assignments) or self.assignments[position] < 0:
+                continue
+            cell = self.assignments[position]
+            self.lists[cell] = self.lists[cell][self.lists[cell] != position]
+            self.assignments[position] = -1
+
+    def candidates(self, query, nprobe=None):
+        """Row positions stored in the `nprobe` cells nearest to the query"""
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        query = self._normalize(np.asarray(query, dtype=np.float32).reshape(-1))
+        cell_scores = self.centroids @ query
+        if nprobe < self.nlist:
+            cells = np.argpartition(-cell_scores, nprobe - 1)[:nprobe]
+        else:
+            cells = np.arange(self.nlist)
+        return np.concatenate([self.lists[cell] for cell in cells])
+
+    def save(self, path):
+        offsets = np.cumsum([0] + [len(positions) for positions in self.lists])
+        np.savez(path, centroids=self.centroids,
+                 positions=np.concatenate(self.lists) if self.lists else np.empty(0, dtype=np.int64),
+                 offsets=offsets, assignments=self.assignments,
+                 params=np.array([self.nlist, self.nprobe, self.iterations, self.train_size, self.seed]))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        nlist, nprobe, iterations, train_size, seed = (int(value) for value in data['params'])
+        index = cls(nlist=nlist, nprobe=nprobe, iterations=iterations, train_size=train_size, seed=seed)
+        index.centroids = data['centroids']
+        offsets = data['offsets']
+        positions = data['positions']
+        index.lists = [positions[offsets[i]:offsets[i + 1]].copy() for i in range(len(offsets) - 1)]
+        index.assignments = data['assignments']
+        return index
@@ -0,0 +1,308 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+import aiohttp
+from bs4 import BeautifulSoup
+from JsonLines import JsonlWriter
+from RecipeScraper import RecipeScraper, parse_recipe_html
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_DONE = object()
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average with bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class AsyncCrawler:
+    """asyncio crawl of a RecipeScraper site: paginated listing in, parsed recipes out
+
+    Listing pages are followed through their "next" links while recipe pages
+    discovered so far are already being fetched. Requests share one aiohttp
+    session whose connector caps open connections overall and per host, every
+    host gets its own token bucket, robots.txt is honoured, and 429/5xx
+    responses or connection errors are retried with exponential backoff and
+    jitter (or the server's Retry-After).
+
+    With parse_workers > 0 fetching and parsing are separate stages: fetch
+    tasks put raw HTML on a bounded queue and parse tasks hand it to a pool of
+    processes, so BeautifulSoup work runs on every core instead of holding the
+    event loop's GIL. Recipes are yielded as soon as their parse finishes.
+    """
+
+    def __init__(self, scraper=None, max_concurrency=16, per_host=8, rate=4.0, burst=None, max_retries=3,
+                 backoff=0.5, timeout=30, respect_robots=True, save_html=None, parse_workers=0):
+        self.scraper = scraper or RecipeScraper()
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.respect_robots = respect_robots
+        # Directory that receives the raw HTML of every recipe page, e.g. as parser benchmark fixtures
+        self.save_html = save_html
+        self.parse_workers = parse_workers
+        self.buckets = {}
+        self.robots = {}
+        self.stats = {"fetched": 0, "retries": 0, "failed": 0, "skipped_robots": 0, "listing_pages": 0}
+
+    def session(self):
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.per_host)
+        return aiohttp.ClientSession(headers=dict(self.scraper.session.headers), connector=connector,
+                                     timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    def _bucket(self, url):
+        host = urlsplit(url).netloc
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate, self.burst)
+        return self.buckets[host]
+
+    async def fetch(self, session, url, headers=None):
+        """GET with per-host rate limiting and retries; returns (status, body, headers)"""
+        for attempt in range(self.max_retries + 1):
+            await self._bucket(url).acquire()
+            retry_after = None
+            try:
+                async with session.get(url, headers=headers) as response:
+                    body = await response.read()
+                    if response.status not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                        self.stats["fetched"] += 1
+                        return response.status, body, response.headers
+                    retry_after = response.headers.get('Retry-After')
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == self.max_retries:
+                    raise
+            self.stats["retries"] += 1
+            if retry_after and retry_after.isdigit():
+                delay = float(retry_after)
+            else:
+                delay = self.backoff * 2 ** attempt * (1 + random.random())
+            await asyncio.sleep(delay)
+
+    async def _load_robots(self, session, root):
+        parser = RobotFileParser()
+        try:
+            status, body, _ = await self.fetch(session, f"{root}/robots.txt")
+            parser.parse(body.decode('utf-8', 'replace').splitlines() if status == 200 else [])
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            parser.parse([])
+        return parser
+
+    async def allowed(self, session, url):
+        if not self.respect_robots:
+            return True
+        parts = urlsplit(url)
+        root = f"{parts.scheme}://{parts.netloc}"
+        # Concurrent first requests to a host share one robots.txt fetch
+        if root not in self.robots:
+            self.robots[root] = asyncio.ensure_future(self._load_robots(session, root))
+        parser = await self.robots[root]
+        return parser.can_fetch(self.scraper.session.headers.get('User-Agent', '*'), url)
+
+    async def recipe_links(self, session, max_pages=None):
+        """Yield recipe URLs page by page, following the listing's pagination"""
+        seen = set()
+        visited = set()
+        page_url = self.scraper.listing_url
+        while page_url and page_url not in visited and (max_pages is None or len(visited) < max_pages):
+            visited.add(page_url)
+            status, body, _ = await self.fetch(session, page_url)
+            if status != 200:
+                print(f"Listing page {page_url} returned {status}")
+                break
+            self.stats["listing_pages"] += 1
+            soup = BeautifulSoup(body, self.scraper.parser)
+            for link in self.scraper.extract_recipe_links(soup):
+                if link not in seen:
+                    seen.add(link)
+                    yield link
+            page_url = self.scraper.next_page_url(soup, page_url)
+
+    def parse(self, url, body):
+        recipe = self.scraper.parse_recipe(body)
+        recipe['url'] = url
+        return recipe
+
+    async def fetch_page(self, session, url):
+        """(body, headers) of the recipe page at url, or None when it is disallowed, unchanged or unavailable"""
+        if not await self.allowed(session, url):
+            self.stats["skipped_robots"] += 1
+            return None
+        crawl_state = self.scraper.crawl_state
+        headers = crawl_state.conditional_headers(url) if crawl_state else None
+        status, body, response_headers = await self.fetch(session, url, headers=headers)
+        if status == 304 and crawl_state:
+            crawl_state.not_modified(url)
+            return None
+        if status != 200:
+            self.stats["failed"] += 1
+            print(f"Failed to fetch {url}: HTTP {status}")
+            return None
+        if self.save_html:
+            os.makedirs(self.save_html, exist_ok=True)
+            with open(os.path.join(self.save_html, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.html'), 'wb') as f:
+                f.write(body)
+        return body, response_headers
+
+    async def scrape(self, session, url):
+        """Parsed recipe at url, or None when it is disallowed, cannot be fetched or has not changed"""
+        page = await self.fetch_page(session, url)
+        if page is None:
+            return None
+        body, headers = page
+        return self.scraper.track_changes(url, self.parse(url, body), headers)
+
+    def parse_pool(self):
+        # spawn keeps the children free of the event loop and aiohttp threads of this process
+        return ProcessPoolExecutor(self.parse_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def iter_recipes(self, urls=None, max_pages=None, limit=None):
+        """Yield (url, recipe) as pages finish; crawls the listing when no urls are given"""
+        todo = asyncio.Queue(maxsize=2 * self.max_concurrency)
+        pages = asyncio.Queue(maxsize=4 * max(1, self.parse_workers))
+        results = asyncio.Queue()
+        pool = self.parse_pool() if self.parse_workers else None
+        # Each parse worker keeps one page in flight in the pool and one being handed over
+        parsers = 2 * self.parse_workers
+        fetchers_left = [self.max_concurrency]
+        pool_errors = []
+
+        async with self.session() as session:
+            # End-of-stream sentinels are only sent on normal completion; a cancelled
+            # task must not block on a full queue that nobody reads any more
+            async def produce():
+                try:
+                    count = 0
+                    if urls is not None:
+                        for url in urls:
+                            if limit is not None and count >= limit:
+                                break
+                            await todo.put(url)
+                            count += 1
+                    else:
+                        async for url in self.recipe_links(session, max_pages):
+                            if limit is not None and count >= limit:
+                                break
+                            await todo.put(url)
+                            count += 1
+                except Exception as e:
+                    print(f"Error crawling listing: {str(e)}")
+                for _ in range(self.max_concurrency):
+                    await todo.put(_DONE)
+
+            async def work():
+                while True:
+                    url = await todo.get()
+                    if url is _DONE:
+                        break
+                    try:
+                        if pool is not None:
+                            page = await self.fetch_page(session, url)
+                            if page is not None:
+                                await pages.put((url, *page))
+                            continue
+                        recipe = await self.scrape(session, url)
+                    except Exception as e:
+                        self.stats["failed"] += 1
+                        print(f"Error scraping {url}: {str(e)}")
+                        recipe = None
+                    if recipe is not None:
+                        await results.put((url, recipe))
+                if pool is None:
+                    await results.put(_DONE)
+                else:
+                    fetchers_left[0] -= 1
+                    if not fetchers_left[0]:
+                        for _ in range(parsers):
+                            await pages.put(_DONE)
+
+            async def parse():
+                loop = asyncio.get_running_loop()
+                while True:
+                    item = await pages.get()
+                    if item is _DONE:
+                        break
+                    url, body, headers = item
+                    try:
+                        recipe = await loop.run_in_executor(pool, parse_recipe_html, body, url,
+                                                            self.scraper.base_url, self.scraper.parser)
+                        recipe = self.scraper.track_changes(url, recipe, headers)
+                    except BrokenProcessPool as e:
+                        pool_errors.append(e)
+                        break
+                    except Exception as e:
+                        self.stats["failed"] += 1
+                        print(f"Error parsing {url}: {str(e)}")
+                        recipe = None
+                    if recipe is not None:
+                        await results.put((url, recipe))
+                await results.put(_DONE)
+
+            tasks = [asyncio.create_task(produce())]
+            tasks += [asyncio.create_task(work()) for _ in range(self.max_concurrency)]
+            tasks += [asyncio.create_task(parse()) for _ in range(parsers)]
+            try:
+                finished = 0
+                while finished < (parsers if pool is not None else self.max_concurrency):
+                    item = await results.get()
+                    if item is _DONE:
+                        finished += 1
+                    else:
+                        yield item
+                if pool_errors:
+                    raise pool_errors[0]
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                if pool is not None:
+                    pool.shutdown(cancel_futures=True)
+
+    @staticmethod
+    def _progress(count, start):
+        if count % 100 == 0:
+            print(f"Scraped {count} recipes ({count / (time.perf_counter() - start):.1f} pages/s)")
+
+    async def crawl(self, urls=None, max_pages=None, limit=None):
+        """Every recipe from iter_recipes, in completion order"""
+        recipes = []
+        start = time.perf_counter()
+        async for _, recipe in self.iter_recipes(urls=urls, max_pages=max_pages, limit=limit):
+            recipes.append(recipe)
+            self._progress(len(recipes), start)
+        return recipes
+
+    async def crawl_to_jsonl(self, path, append=False, urls=None, max_pages=None, limit=None):
+        """crawl, writing each recipe to a JSONL file as it arrives; returns how many were written"""
+        start = time.perf_counter()
+        with JsonlWriter(path, append=append) as writer:
+            async for _, recipe in self.iter_recipes(urls=urls, max_pages=max_pages, limit=limit):
+                writer.write(recipe)
+                self._progress(writer.count, start)
+        return writer.count
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+def default_path(path=None):
+    return path or os.getenv("CRAWL_STATE_PATH", "./dataset/crawl_state.sqlite")
+
+class CrawlState:
+    """SQLite record of every crawled URL with its validators and the hash of the recipe parsed from it
+
+    conditional_headers turns the stored ETag/Last-Modified into If-None-Match /
+    If-Modified-Since, so unchanged pages come back as an empty 304. For pages
+    that are downloaded, record compares the parsed recipe's hash with the
+    stored one; only "new" or "changed" recipes are passed downstream.
+
+    A passed-on recipe stays pending until acknowledge() is called for its URL
+    once it is stored, or deliberately skipped by processing. Pending pages are fetched in full and passed on again by
+    later crawls, so a recipe lost between crawl and storage is not skipped.
+    """
+
+    def __init__(self, path=None):
+        self.path = default_path(path)
+        self.counts = {"new": 0, "changed": 0, "unchanged": 0, "not_modified": 0}
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                last_checked REAL NOT NULL,
+                last_changed REAL NOT NULL,
+                pending TEXT
+            )""")
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(pages)")]
+        if 'pending' not in columns:
+            # Pages recorded before acknowledgements existed are taken as stored
+            self.connection.execute("ALTER TABLE pages ADD COLUMN pending TEXT")
+        self.connection.commit()
+
+    @staticmethod
+    def content_hash(recipe):
+        """Hash of the parsed fields, so markup churn that leaves the recipe intact is not a change"""
+        fields = {field: value for field, value in recipe.items() if field not in ('url', 'crawl_status')}
+        return hashlib.sha256(json.dumps(fields, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def conditional_headers(self, url):
+        with self._lock:
+            row = self.connection.execute("SELECT etag, last_modified FROM pages WHERE url = ? AND pending IS NULL",
+                                          (url,)).fetchone()
+        headers = {}
+        if row and row[0]:
+            headers['If-None-Match'] = row[0]
+        if row and row[1]:
+            headers['If-Modified-Since'] = row[1]
+        return headers
+
+    def not_modified(self, url):
+        """Note a 304 for url"""
+        with self._lock:
+            self.connection.execute("UPDATE pages SET last_checked = ? WHERE url = ?", (time.time(), url))
+            self.connection.commit()
+            self.counts["not_modified"] += 1
+
+    def record(self, url, recipe, headers=None):
+        """Store the page's validators and recipe hash; returns "new", "changed" or None when unchanged
+
+        An unchanged page that is still pending returns its pending status again.
+        """
+        headers = headers or {}
+        content_hash = self.content_hash(recipe)
+        now = time.time()
+        with self._lock:
+            row = self.connection.execute("SELECT content_hash, pending FROM pages WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                status = "new"
+                self.connection.execute(
+                    "INSERT INTO pages (url, etag, last_modified, content_hash, first_seen, last_checked, last_changed, "
+                    "pending) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (url, headers.get('ETag'), headers.get('Last-Modified'), content_hash, now, now, now, status))
+            else:
+                # A page that was never stored stays "new"; its document still has to be created
+                status = row[1] or ("changed" if row[0] != content_hash else None)
+                self.connection.execute(
+                    "UPDATE pages SET etag = ?, last_modified = ?, content_hash = ?, last_checked = ?, pending = ?, "
+                    "last_changed = CASE WHEN content_hash = ? THEN last_changed ELSE ? END WHERE url = ?",
+                    (headers.get('ETag'), headers.get('Last-Modified'), content_hash, now, status,
+                     content_hash, now, url))
+            self.connection.commit()
+            self.counts[status or "unchanged"] += 1
+        return status
+
+    def acknowledge(self, urls):
+        """Mark the recipes of urls as stored or deliberately skipped, so later crawls may skip them while they are unchanged"""
+        with self._lock:
+            self.connection.executemany("UPDATE pages SET pending = NULL WHERE url = ?", [(url,) for url in urls])
+            self.connection.commit()
+
+    def stats(self):
+        with self._lock:
+            pages, pending = self.connection.execute(
+                "SELECT COUNT(*), COUNT(pending) FROM pages").fetchone()
+        return {**self.counts, "pages": pages, "pending": pending}
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
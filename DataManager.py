@@ -1,9 +1,32 @@
 import os
+import threading
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from datetime import timedelta
 from couchbase.auth import PasswordAuthenticator
 from couchbase.cluster import Cluster
-from couchbase.options import ClusterOptions
+from couchbase.exceptions import DocumentExistsException
+from couchbase.management.search import SearchIndex
+from couchbase.options import ClusterOptions, QueryOptions, SearchOptions
+from couchbase.search import ConjunctionQuery, NumericRangeQuery, SearchRequest, TermQuery
+from couchbase.vector_search import VectorQuery, VectorSearch
+from EmbeddingCodec import default_codec
+
+_clusters = {}
+_clusters_lock = threading.Lock()
+
+def get_cluster(endpoint, username, password):
+    """Return the process-wide Cluster for these credentials, connecting on first use"""
+    key = (endpoint, username, password)
+    with _clusters_lock:
+        cluster = _clusters.get(key)
+        if cluster is None:
+            auth = PasswordAuthenticator(username, password)
+            cluster = Cluster(endpoint, ClusterOptions(auth))
+            cluster.wait_until_ready(timedelta(seconds=5))
+            _clusters[key] = cluster
+        return cluster
 
 class DataManager:
 
@@ -18,19 +41,92 @@ class DataManager:
         self.bucket_name = bucket_name or os.getenv("BUCKET_NAME")
         self.scope_name = scope_name or os.getenv("SCOPE_NAME")
         self.collection_name = collection_name or os.getenv("COLLECTION_NAME")
+        self.vector_index_name = os.getenv("VECTOR_INDEX_NAME", "recipe_vector_index")
 
-        auth = PasswordAuthenticator(self.username, self.password)
-        options = ClusterOptions(auth)
-        
-        self.cluster = Cluster(self.endpoint, options)
-        self.cluster.wait_until_ready(timedelta(seconds=5))
+        self.cluster = get_cluster(self.endpoint, self.username, self.password)
         
         self.bucket = self.cluster.bucket(self.bucket_name)
-        self.collection = self.bucket.scope(self.scope_name).collection(self.collection_name)
+        self.scope = self.bucket.scope(self.scope_name)
+        self.collection = self.scope.collection(self.collection_name)
 
     def insert(self, key, document):
-        if not self.collection.exists(key).exists:
+        try:
             return self.collection.insert(key, document)
+        except DocumentExistsException:
+            return None
+    
+    def _insert_batch(self, batch):
+        counts = {"inserted": 0, "exists": 0, "failed": 0}
+        failures = {}
+        try:
+            result = self.collection.insert_multi(dict(batch), return_exceptions=True)
+        except Exception as e:
+            counts["failed"] = len(batch)
+            failures = {key: str(e) for key, _ in batch}
+            return counts, failures
+        for key, _ in batch:
+            error = result.exceptions.get(key) if result.exceptions else None
+            if error is None:
+                counts["inserted"] += 1
+            elif isinstance(error, DocumentExistsException):
+                counts["exists"] += 1
+            else:
+                counts["failed"] += 1
+                failures[key] = str(error)
+        return counts, failures
+    
+    def _upsert_batch(self, batch):
+        counts = {"upserted": 0, "failed": 0}
+        failures = {}
+        try:
+            result = self.collection.upsert_multi(dict(batch), return_exceptions=True)
+        except Exception as e:
+            counts["failed"] = len(batch)
+            failures = {key: str(e) for key, _ in batch}
+            return counts, failures
+        for key, _ in batch:
+            error = result.exceptions.get(key) if result.exceptions else None
+            if error is None:
+                counts["upserted"] += 1
+            else:
+                counts["failed"] += 1
+                failures[key] = str(error)
+        return counts, failures
+    
+    def _write_many(self, write_batch, totals, items, batch_size, max_workers):
+        items = iter(items)
+        failures = {}
+        
+        def merge(future):
+            counts, batch_failures = future.result()
+            for name, count in counts.items():
+                totals[name] += count
+            failures.update(batch_failures)
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = []
+            while True:
+                batch = list(islice(items, batch_size))
+                if not batch:
+                    break
+                pending.append(executor.submit(write_batch, batch))
+                # Bound the number of batches held in memory at once
+                if len(pending) >= max_workers * 2:
+                    merge(pending.pop(0))
+            for future in pending:
+                merge(future)
+        
+        totals["failures"] = failures
+        return totals
+    
+    def insert_many(self, items, batch_size=500, max_workers=4):
+        """Insert-if-absent for an iterable of (key, document) pairs, batched and run concurrently"""
+        return self._write_many(self._insert_batch, {"inserted": 0, "exists": 0, "failed": 0},
+                                items, batch_size, max_workers)
+    
+    def upsert_many(self, items, batch_size=500, max_workers=4):
+        """Insert-or-replace for an iterable of (key, document) pairs, batched and run concurrently"""
+        return self._write_many(self._upsert_batch, {"upserted": 0, "failed": 0}, items, batch_size, max_workers)
     
     def read(self, key):
         return self.collection.get(key)
@@ -46,6 +142,131 @@ class DataManager:
             documents.append(row)
         return documents
     
+    def read_since(self, created_at):
+        query = f"""
+            SELECT RAW doc 
+            FROM `{self.bucket_name}`.`{self.scope_name}`.`{self.collection_name}` AS doc 
+            WHERE doc.created_at > $since """
+        
+        result = self.cluster.query(query, QueryOptions(named_parameters={"since": created_at}))
+        return [row for row in result]
+    
+    def read_embeddings(self, fields=(), since=None):
+        """Narrow projection for scoring: document key, embedding and created_at, plus any extra `fields`"""
+        projection = ", ".join(
+            ["META(doc).id AS id", "doc.embedding", "doc.embedding_codec", "doc.embedding_scale", "doc.created_at"] +
+            [f"doc.`{field}`" for field in fields])
+        query = f"""
+            SELECT {projection} 
+            FROM `{self.bucket_name}`.`{self.scope_name}`.`{self.collection_name}` AS doc 
+            WHERE doc.embedding IS NOT MISSING"""
+        
+        if since is None:
+            result = self.cluster.query(query)
+        else:
+            query += " AND doc.created_at > $since"
+            result = self.cluster.query(query, QueryOptions(named_parameters={"since": since}))
+        return [row for row in result]
+    
+    def find_recipe_keys(self, source_urls=(), names=()):
+        """Keys of stored scraped recipes: ({source_url: key}, {recipe_name: key})
+
+        Names only match recipes scraped before ids were derived from the URL,
+        i.e. recipe_<n> keys without a source_url.
+        """
+        query = f"""
+            SELECT META(doc).id AS id, doc.source_url, doc.recipe_name 
+            FROM `{self.bucket_name}`.`{self.scope_name}`.`{self.collection_name}` AS doc 
+            WHERE doc.source_url IN $urls 
+               OR (doc.source_url IS NOT VALUED AND doc.recipe_name IN $names 
+                   AND REGEXP_LIKE(META(doc).id, "^recipe_[0-9]+$"))"""
+        
+        result = self.cluster.query(query, QueryOptions(named_parameters={"urls": list(source_urls),
+                                                                          "names": list(names)}))
+        by_url = {}
+        by_name = {}
+        for row in result:
+            if row.get('source_url'):
+                by_url[row['source_url']] = row['id']
+            elif row.get('recipe_name'):
+                by_name.setdefault(row['recipe_name'], row['id'])
+        return by_url, by_name
+    
+    def get_many(self, keys):
+        """Multi-get documents by key, returning {key: document} for the keys that exist"""
+        if not keys:
+            return {}
+        result = self.collection.get_multi(list(keys), return_exceptions=True)
+        return {key: get_result.content_as[dict] for key, get_result in result.results.items()}
+    
+    def create_vector_index(self, dims, similarity="dot_product", codec=None):
+        """Create or update the Search index over `embedding` plus the fields vector_search can filter on"""
+        codec = codec or default_codec()
+        if codec not in ("list", "float32"):
+            raise ValueError(f"Search vector indexes need list or float32 embeddings, not {codec}")
+        vector_type = "vector" if codec == "list" else "vector_base64"
+        
+        def field(name, field_type, **extra):
+            return {"enabled": True, "dynamic": False,
+                    "fields": [dict(name=name, type=field_type, index=True, **extra)]}
+        
+        params = {
+            "doc_config": {"mode": "scope.collection.type_field", "type_field": "type"},
+            "mapping": {
+                # Single-token, lowercased categories, matching the case-insensitive client-side filter
+                "analysis": {
+                    "analyzers": {
+                        "keyword_lower": {"type": "custom", "tokenizer": "single", "token_filters": ["to_lower"]}
+                    }
+                },
+                "default_mapping": {"enabled": False},
+                "index_dynamic": False,
+                "store_dynamic": False,
+                "types": {
+                    f"{self.scope_name}.{self.collection_name}": {
+                        "enabled": True,
+                        "dynamic": False,
+                        "properties": {
+                            "embedding": field("embedding", vector_type, dims=dims, similarity=similarity,
+                                               vector_index_optimized_for="latency"),
+                            "recipe_category": field("recipe_category", "text", analyzer="keyword_lower"),
+                            "calories": field("calories", "number"),
+                            "aggregated_rating": field("aggregated_rating", "number"),
+                            "total_time_minutes": field("total_time_minutes", "number"),
+                        }
+                    }
+                }
+            },
+            "store": {"indexType": "scorch"}
+        }
+        index = SearchIndex(name=self.vector_index_name, source_name=self.bucket_name, params=params)
+        self.scope.search_indexes().upsert_index(index)
+    
+    @staticmethod
+    def _filter_query(filters):
+        """Case-insensitive equality for strings, (min, max) tuples for inclusive numeric ranges"""
+        queries = []
+        for name, value in (filters or {}).items():
+            if isinstance(value, (tuple, list)):
+                low, high = value
+                queries.append(NumericRangeQuery(min=low, max=high, min_inclusive=True,
+                                                 max_inclusive=True, field=name))
+            else:
+                # Term queries are not analyzed, so normalize like the keyword_lower analyzer and FilterIndex do
+                queries.append(TermQuery(str(value).strip().lower(), field=name))
+        return ConjunctionQuery(*queries) if queries else None
+    
+    def vector_search(self, embedding, k=3, filters=None):
+        """Top-k documents by vector similarity, scored server-side; returns [(key, document, score)]"""
+        prefilter = self._filter_query(filters)
+        vector_query = VectorQuery("embedding", list(embedding), num_candidates=k,
+                                   **({"prefilter": prefilter} if prefilter else {}))
+        request = SearchRequest.create(VectorSearch.from_vector_query(vector_query))
+        result = self.scope.search(self.vector_index_name, request, SearchOptions(limit=k))
+        hits = [(row.id, row.score) for row in result.rows()]
+        documents = self.get_many([key for key, _ in hits])
+        return [(key, documents[key], score) for key, score in hits if key in documents]
+    
     def update(self, key, document):
         return self.collection.replace(key, document)
     
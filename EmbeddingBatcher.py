@@ -0,0 +1,94 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from ModelRegistry import ModelRegistry
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-text encodes into one model.encode call
+
+    A worker thread takes the first queued text, waits at most `max_wait_ms`
+    for more to arrive (never beyond `max_batch_size`), encodes the distinct
+    texts as one batch and resolves each caller's future with its row. The
+    wait bounds the latency a lone request pays; under load batches fill up
+    before the deadline and the model runs far fewer, larger passes.
+    """
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, model, max_batch_size=32, max_wait_ms=2):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.pid = os.getpid()
+        self.requests = 0
+        self.batch_sizes = {}
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    @classmethod
+    def get_shared(cls, model_name='all-MiniLM-L6-v2'):
+        """Process-wide batcher per model; None when EMBEDDING_BATCH_MAX_WAIT_MS is 0"""
+        max_wait_ms = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "2"))
+        if max_wait_ms <= 0:
+            return None
+        with cls._shared_lock:
+            batcher = cls._shared.get(model_name)
+            # A forked child inherits the registry but not the worker thread
+            if batcher is None or batcher.pid != os.getpid():
+                batcher = cls(ModelRegistry.get(model_name),
+                              max_batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+                              max_wait_ms=max_wait_ms)
+                cls._shared[model_name] = batcher
+            return batcher
+
+    def encode(self, text, timeout=None):
+        """Embedding of one text as a numpy array, computed in whatever batch it lands in"""
+        future = Future()
+        self._queue.put((text, future))
+        return future.result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            unique_texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                encoded = self.model.encode(unique_texts, batch_size=len(unique_texts), convert_to_numpy=True)
+                vectors = dict(zip(unique_texts, encoded))
+                for text, future in batch:
+                    future.set_result(vectors[text])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            with self._stats_lock:
+                self.requests += len(batch)
+                self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+
+    def stats(self):
+        with self._stats_lock:
+            batches = sum(self.batch_sizes.values())
+            return {
+                'requests': self.requests,
+                'batches': batches,
+                'mean_batch_size': round(self.requests / batches, 2) if batches else 0.0,
+                'batch_size_histogram': dict(sorted(self.batch_sizes.items())),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+            }
@@ -0,0 +1,99 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+
+class EmbeddingCache:
+    """In-memory LRU of embeddings keyed by (model_name, cleaned ingredient text), optionally backed by SQLite"""
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_entries=10000, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.connection = None
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    PRIMARY KEY (model, text)
+                )""")
+            self.connection.commit()
+
+    @classmethod
+    def get_shared(cls):
+        """Process-wide cache; persisted to EMBEDDING_CACHE_PATH when that is set"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(path=os.getenv("EMBEDDING_CACHE_PATH"))
+            return cls._shared
+
+    def _remember(self, key, vector):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, model_name, text):
+        key = (model_name, text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+            if self.connection is not None:
+                row = self.connection.execute(
+                    "SELECT vector FROM embeddings WHERE model = ? AND text = ?", key).fetchone()
+                if row is not None:
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, vector)
+                    self.hits += 1
+                    return vector
+            self.misses += 1
+            return None
+
+    def put(self, model_name, text, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        key = (model_name, text)
+        with self._lock:
+            self._remember(key, vector)
+            if self.connection is not None:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO embeddings (model, text, vector) VALUES (?, ?, ?)",
+                    (model_name, text, vector.tobytes()))
+                self.connection.commit()
+
+    def put_many(self, model_name, texts, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                self._remember((model_name, text), vector)
+            if self.connection is not None:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, text, vector) VALUES (?, ?, ?)",
+                    [(model_name, text, vector.tobytes()) for text, vector in zip(texts, vectors)])
+                self.connection.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
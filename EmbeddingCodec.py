@@ -0,0 +1,52 @@
+import base64
+import os
+import numpy as np
+
+# "list" is the original JSON float list; the others are base64 strings.
+# float32 matches Couchbase's vector_base64 field type, so it can still be indexed server-side.
+CODECS = ("list", "float32", "float16", "int8")
+
+
+def default_codec():
+    # Read on each call: this module is imported before callers run load_dotenv()
+    return os.getenv("EMBEDDING_CODEC", "float32")
+
+def encode_embedding(embedding, codec=None):
+    """Return the document fields that store `embedding` with the given codec"""
+    codec = codec or default_codec()
+    vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    if codec == "list":
+        return {"embedding": vector.tolist(), "embedding_codec": "list"}
+    if codec == "float32":
+        data = vector.astype('<f4').tobytes()
+        return {"embedding": base64.b64encode(data).decode('ascii'), "embedding_codec": "float32"}
+    if codec == "float16":
+        data = vector.astype('<f2').tobytes()
+        return {"embedding": base64.b64encode(data).decode('ascii'), "embedding_codec": "float16"}
+    if codec == "int8":
+        # Symmetric scalar quantization: one scale per vector, stored next to it
+        peak = float(np.abs(vector).max()) if len(vector) else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        data = np.clip(np.round(vector / scale), -127, 127).astype(np.int8).tobytes()
+        return {"embedding": base64.b64encode(data).decode('ascii'), "embedding_codec": "int8",
+                "embedding_scale": scale}
+    raise ValueError(f"Unknown embedding codec: {codec}")
+
+def decode_embedding(document):
+    """float32 vector from a recipe document in any codec, including old list-format documents"""
+    embedding = document.get('embedding')
+    if embedding is None:
+        return None
+    codec = document.get('embedding_codec', 'list')
+    if codec == "list" or isinstance(embedding, list):
+        return np.asarray(embedding, dtype=np.float32)
+    data = base64.b64decode(embedding)
+    if codec == "float32":
+        return np.frombuffer(data, dtype='<f4').astype(np.float32)
+    if codec == "float16":
+        return np.frombuffer(data, dtype='<f2').astype(np.float32)
+    if codec == "int8":
+        return np.frombuffer(data, dtype=np.int8).astype(np.float32) * np.float32(document.get('embedding_scale', 1.0))
+    raise ValueError(f"Unknown embedding codec: {codec}")
+
+EMBEDDING_FIELDS = ("embedding", "embedding_codec", "embedding_scale")
@@ -0,0 +1,108 @@
+import glob
+import json
+import os
+import time
+import numpy as np
+from RecipeIndex import RecipeIndex
+
+SNAPSHOT_FORMAT = 1
+
+class EmbeddingSnapshot:
+    """On-disk copy of a RecipeIndex: a float32 .npy matrix loaded with np.memmap plus a JSON id/metadata sidecar
+
+    Processes that load the same snapshot share the matrix through the page cache.
+    Each export writes new files and then atomically swaps `current.json`, so
+    readers never see a half-written snapshot.
+    """
+
+    def __init__(self, directory=None, max_age=24 * 3600):
+        self.directory = directory or os.getenv("RECIPE_SNAPSHOT_DIR", "./dataset/snapshot")
+        self.max_age = max_age
+
+    def _pointer_path(self):
+        return os.path.join(self.directory, "current.json")
+
+    def export(self, index, projection=None):
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot_id = f"{int(time.time() * 1000)}-{os.getpid()}"
+        matrix_file = f"embeddings-{snapshot_id}.npy"
+        sidecar_file = f"metadata-{snapshot_id}.json"
+
+        np.save(os.path.join(self.directory, matrix_file), np.ascontiguousarray(index.rows(), dtype=np.float32))
+        version = {
+            "format": SNAPSHOT_FORMAT,
+            "model": (index.columns.get("embedding_model") or [None])[0],
+            "dim": index.embedding_dim,
+            "count": len(index),
+            "last_created_at": index.last_created_at,
+            "exported_at": time.time(),
+            "projection": projection,
+        }
+        with open(os.path.join(self.directory, sidecar_file), 'w', encoding='utf-8') as f:
+            json.dump({"version": version, "ids": list(index.ids), "columns": index.columns}, f, ensure_ascii=False)
+
+        pointer_tmp = self._pointer_path() + f".{snapshot_id}.tmp"
+        with open(pointer_tmp, 'w', encoding='utf-8') as f:
+            json.dump({"matrix": matrix_file, "sidecar": sidecar_file, "version": version}, f)
+        os.replace(pointer_tmp, self._pointer_path())
+
+        # Old files can go right away: processes that mapped them keep the pages until they exit
+        for path in glob.glob(os.path.join(self.directory, "embeddings-*.npy")) + \
+                glob.glob(os.path.join(self.directory, "metadata-*.json")):
+            if os.path.basename(path) not in (matrix_file, sidecar_file):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        print(f"Exported snapshot of {len(index)} recipes to {self.directory}")
+        return version
+
+    def version(self):
+        try:
+            with open(self._pointer_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)["version"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def is_stale(self, version=None, model_name=None, projection=None):
+        version = version or self.version()
+        if version is None or version.get("format") != SNAPSHOT_FORMAT:
+            return True
+        if projection is not None and version.get("projection") != list(projection):
+            return True
+        if model_name and version.get("model") not in (None, model_name):
+            return True
+        return self.max_age is not None and time.time() - version.get("exported_at", 0) > self.max_age
+
+    def load(self):
+        """Return a RecipeIndex backed by a read-only memmap of the snapshot, or None if there is none"""
+        try:
+            with open(self._pointer_path(), 'r', encoding='utf-8') as f:
+                pointer = json.load(f)
+            matrix = np.load(os.path.join(self.directory, pointer["matrix"]), mmap_mode='r')
+            with open(os.path.join(self.directory, pointer["sidecar"]), 'r', encoding='utf-8') as f:
+                sidecar = json.load(f)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"No usable snapshot in {self.directory}: {e}")
+            return None
+
+        index = RecipeIndex.from_matrix(sidecar["ids"], matrix, sidecar["columns"], normalized=True)
+        index.last_created_at = sidecar["version"].get("last_created_at")
+        return index
+
+def main():
+    import argparse
+    from DataManager import DataManager
+    from RecipeIndex import SharedRecipeIndex
+
+    parser = argparse.ArgumentParser(description="Export all recipe embeddings from Couchbase to a memory-mappable snapshot")
+    parser.add_argument('directory', nargs='?', help="defaults to RECIPE_SNAPSHOT_DIR or ./dataset/snapshot")
+    parser.add_argument('--full', action='store_true', help="keep full recipe metadata instead of ids and embeddings only")
+    args = parser.parse_args()
+
+    # Same fields and projection stamp as SharedRecipeIndex.load expects, so app processes accept the snapshot
+    shared = SharedRecipeIndex(DataManager(), snapshot=EmbeddingSnapshot(args.directory), lazy=not args.full)
+    shared.export_snapshot()
+
+if __name__ == "__main__":
+    main()
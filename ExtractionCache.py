@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+class ExtractionCache:
+    """SQLite cache of LLM ingredient extractions keyed by normalized text, model and prompt version"""
+
+    def __init__(self, path=None, max_bytes=256 * 1024 * 1024):
+        self.path = path or os.getenv("EXTRACTION_CACHE_PATH", "./dataset/extraction_cache.sqlite")
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS extractions (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS extractions_last_used ON extractions(last_used)")
+        self.connection.commit()
+        self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+
+    @staticmethod
+    def normalize(text):
+        return re.sub(r'\s+', ' ', text.strip().lower())
+
+    def make_key(self, text, model, prompt_version):
+        raw = f"{model}\x00{prompt_version}\x00{self.normalize(text)}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, text, model, prompt_version):
+        key = self.make_key(text, model, prompt_version)
+        with self._lock:
+            row = self.connection.execute("SELECT result FROM extractions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.connection.execute("UPDATE extractions SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.connection.commit()
+        return json.loads(row[0])
+
+    def put(self, text, model, prompt_version, result):
+        key = self.make_key(text, model, prompt_version)
+        value = json.dumps(result)
+        size = len(key) + len(value)
+        with self._lock:
+            previous = self.connection.execute("SELECT size FROM extractions WHERE key = ?", (key,)).fetchone()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO extractions (key, result, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()))
+            self.total_bytes += size - (previous[0] if previous else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self.connection.commit()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is back under 90% of max_bytes"""
+        target = self.max_bytes * 0.9
+        rows = self.connection.execute("SELECT key, size FROM extractions ORDER BY last_used")
+        evicted = []
+        for key, size in rows:
+            if self.total_bytes <= target:
+                break
+            evicted.append((key,))
+            self.total_bytes -= size
+        self.connection.executemany("DELETE FROM extractions WHERE key = ?", evicted)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = self.connection.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": self.total_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
@@ -0,0 +1,74 @@
+import re
+import numpy as np
+
+CATEGORY_FIELDS = ("recipe_category",)
+NUMERIC_FIELDS = ("calories", "aggregated_rating", "total_time_minutes")
+# Document fields the filter index is built from; older documents only carry the ISO
+# total_time, which is parsed when total_time_minutes is missing
+SOURCE_FIELDS = ("recipe_category", "calories", "aggregated_rating", "total_time_minutes", "total_time")
+
+def parse_duration_minutes(value):
+    """Minutes in an ISO-8601 duration such as PT1H30M; None when it cannot be parsed"""
+    if not value or not isinstance(value, str):
+        return None
+    match = re.fullmatch(r'P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?', value.strip())
+    if not match or not any(match.groups()):
+        return None
+    days, hours, minutes, seconds = (int(group) if group else 0 for group in match.groups())
+    return days * 1440 + hours * 60 + minutes + seconds / 60
+
+class RecipeFilterIndex:
+    """Secondary indexes over recipe metadata columns for pruning candidates before vector scoring
+
+    Categories map to sorted arrays of row positions; numeric fields keep their
+    values sorted next to the matching row positions, so a range is two
+    searchsorted calls. Filters use the same format as DataManager.vector_search:
+    a string for equality, a (min, max) pair for an inclusive range.
+    """
+
+    def __init__(self, columns, size):
+        self.size = size
+        self.categories = {}
+        self.numeric = {}
+
+        for field in CATEGORY_FIELDS:
+            values = columns.get(field) or [None] * size
+            buckets = {}
+            for position, value in enumerate(values):
+                if value:
+                    buckets.setdefault(str(value).strip().lower(), []).append(position)
+            self.categories[field] = {value: np.array(positions, dtype=np.int64) for value, positions in buckets.items()}
+
+        for field in NUMERIC_FIELDS:
+            values = columns.get(field) or [None] * size
+            if field == "total_time_minutes":
+                durations = columns.get("total_time") or [None] * size
+                values = [parse_duration_minutes(duration) if value is None else value
+                          for value, duration in zip(values, durations)]
+            numbers = np.array([np.nan if value is None else float(value) for value in values], dtype=np.float64)
+            present = np.flatnonzero(~np.isnan(numbers))
+            order = np.argsort(numbers[present], kind='stable')
+            self.numeric[field] = (numbers[present][order], present[order])
+
+    def category_values(self, field="recipe_category"):
+        return sorted(self.categories.get(field, {}))
+
+    def mask(self, filters):
+        """Boolean mask over rows that satisfy every filter"""
+        mask = np.ones(self.size, dtype=bool)
+        for field, value in filters.items():
+            allowed = np.zeros(self.size, dtype=bool)
+            if field in self.categories:
+                positions = self.categories[field].get(str(value).strip().lower())
+                if positions is not None:
+                    allowed[positions] = True
+            elif field in self.numeric:
+                low, high = value
+                values, positions = self.numeric[field]
+                start = 0 if low is None else np.searchsorted(values, low, side='left')
+                end = len(values) if high is None else np.searchsorted(values, high, side='right')
+                allowed[positions[start:end]] = True
+            else:
+                raise ValueError(f"Cannot filter on {field}")
+            mask &= allowed
+        return mask
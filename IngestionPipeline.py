@@ -0,0 +1,256 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from DataManager import DataManager
+from RecipeEmbedding import RecipeEmbedding
+from OllamaClient import OllamaClient
+from FilterIndex import parse_duration_minutes
+
+COLUMNS = ['RecipeId', 'Name', 'PrepTime', 'TotalTime', 'Images', 'RecipeCategory',
+           'RecipeIngredientQuantities', 'RecipeIngredientParts', 'AggregatedRating', 'Calories']
+
+_DONE = object()
+
+# Set by init_embedding_worker in each process of the embedding pool
+_worker_embedding = None
+
+def init_embedding_worker(model_name, torch_threads, embedding_codec=None):
+    """Load a private model in a pool process and pin its intra-op threads so workers do not oversubscribe cores"""
+    global _worker_embedding
+    import torch
+    torch.set_num_threads(torch_threads)
+    _worker_embedding = RecipeEmbedding(model_name=model_name, embedding_codec=embedding_codec, batcher=False)
+
+def embed_records_in_worker(records, batch_size=64):
+    documents = _worker_embedding.prepare_for_couchbase_batch(records, batch_size=batch_size)
+    print(_worker_embedding.last_batch_summary())
+    return documents
+
+def combine_ingredients(ingredients_str):
+    if isinstance(ingredients_str, str):
+        ingredients_list = ingredients_str[3:-2].split('", "')
+        return ', '.join(ingredients_list)
+    else:
+        return ""
+
+class IngestionPipeline:
+    """Streams recipes.csv through parse -> clean -> embed -> store with bounded queues between stages
+
+    Each stage runs in its own thread and works on one chunk at a time, so the
+    embedding model encodes a chunk while Ollama cleans the next one and
+    Couchbase stores the previous one. Queue sizes cap how many chunks are in
+    memory at once regardless of the size of the CSV.
+
+    With embedding_workers > 0 the embed stage shards chunks across a pool of
+    processes, each with its own model and torch_threads intra-op threads
+    (cores split evenly by default). Chunks come back in submission order, so
+    the single store stage writes the same documents in the same order
+    whatever the worker count.
+    """
+
+    def __init__(self, csv_path, chunk_size=1000, queue_size=2, embedding_batch_size=64,
+                 recipe_embedding=None, data_manager=None, ollama_client=None,
+                 embedding_workers=0, torch_threads=None, model_name='all-MiniLM-L6-v2'):
+        self.csv_path = csv_path
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
+        self.embedding_batch_size = embedding_batch_size
+        self.embedding_workers = embedding_workers
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // max(1, embedding_workers))
+        self.model_name = model_name
+        self.recipe_embedding = recipe_embedding
+        self.data_manager = data_manager
+        self.ollama_client = ollama_client
+        self.stats = {"rows": 0, "inserted": 0, "exists": 0, "failed": 0}
+        self.errors = []
+
+    def read_chunks(self):
+        for chunk in pd.read_csv(self.csv_path, usecols=COLUMNS, chunksize=self.chunk_size):
+            yield chunk
+
+    def parse_chunk(self, chunk):
+        chunk = chunk[COLUMNS].dropna()
+        records = []
+        for _, row in chunk.iterrows():
+            records.append({
+                'recipe_id': str(row['RecipeId']),
+                'recipe_name': str(row['Name']),
+                'ingredient_list': combine_ingredients(row['RecipeIngredientParts']),
+                'additional_fields': {
+                    'prep_time': str(row['PrepTime']) if pd.notna(row['PrepTime']) else None,
+                    'total_time': str(row['TotalTime']) if pd.notna(row['TotalTime']) else None,
+                    'total_time_minutes': parse_duration_minutes(row['TotalTime']) if pd.notna(row['TotalTime']) else None,
+                    'images': str(row['Images']) if pd.notna(row['Images']) else None,
+                    'recipe_category': str(row['RecipeCategory']) if pd.notna(row['RecipeCategory']) else None,
+                    'ingredient_quantities': str(row['RecipeIngredientQuantities']) if pd.notna(row['RecipeIngredientQuantities']) else None,
+                    'aggregated_rating': float(row['AggregatedRating']) if pd.notna(row['AggregatedRating']) else None,
+                    'calories': float(row['Calories']) if pd.notna(row['Calories']) else None,
+                    'created_at': pd.Timestamp.now().isoformat(),
+                }
+            })
+        return records
+
+    def clean_chunk(self, records):
+        cleaned = self.ollama_client.extract_many([record['ingredient_list'] for record in records])
+        for record, ingredient_list in zip(records, cleaned):
+            record['ingredient_list'] = ingredient_list
+        return records
+
+    def embed_chunk(self, records):
+        documents = self.recipe_embedding.prepare_for_couchbase_batch(records, batch_size=self.embedding_batch_size)
+        print(self.recipe_embedding.last_batch_summary())
+        return documents
+
+    def create_embedding_pool(self):
+        # spawn, not fork: torch's thread pools do not survive a fork of a process that already used them
+        context = multiprocessing.get_context("spawn")
+        embedding_codec = self.recipe_embedding.embedding_codec if self.recipe_embedding is not None else None
+        # An executor, not multiprocessing.Pool: a worker that dies (OOM, a crash in torch) fails its
+        # futures with BrokenProcessPool instead of leaving their results pending forever
+        return ProcessPoolExecutor(self.embedding_workers, mp_context=context, initializer=init_embedding_worker,
+                                   initargs=(self.model_name, self.torch_threads, embedding_codec))
+
+    def store_chunk(self, documents):
+        result = self.data_manager.insert_many(
+            (f"recipe::{document['recipe_id']}", document) for document in documents
+        )
+        for name in ("inserted", "exists", "failed"):
+            self.stats[name] += result[name]
+        for key, error in result['failures'].items():
+            print(f"Failed to store {key}: {error}")
+        return result
+
+    def _put(self, outbox, item, stop):
+        while not stop.is_set():
+            try:
+                outbox.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, inbox, stop):
+        while not stop.is_set():
+            try:
+                return inbox.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _source(self, outbox, stop):
+        try:
+            for chunk in self.read_chunks():
+                if stop.is_set():
+                    break
+                records = self.parse_chunk(chunk)
+                self.stats["rows"] += len(records)
+                if records and not self._put(outbox, records, stop):
+                    break
+        except Exception as e:
+            self.errors.append(e)
+            stop.set()
+        finally:
+            self._put(outbox, _DONE, stop)
+
+    def _stage(self, func, inbox, outbox, stop):
+        try:
+            while True:
+                item = self._get(inbox, stop)
+                if item is _DONE:
+                    break
+                if not self._put(outbox, func(item), stop):
+                    break
+        except Exception as e:
+            self.errors.append(e)
+            stop.set()
+        finally:
+            self._put(outbox, _DONE, stop)
+
+    def _embed_stage(self, pool, inbox, outbox, stop):
+        """Keeps up to two chunks per worker in flight and forwards results strictly in input order"""
+        pending = deque()
+        window = 2 * self.embedding_workers
+        finished = False
+        try:
+            while True:
+                while pending and (finished or len(pending) >= window or pending[0].done()):
+                    if not self._put(outbox, pending.popleft().result(), stop):
+                        return
+                if finished:
+                    break
+                try:
+                    item = inbox.get(timeout=0.1)
+                except queue.Empty:
+                    if stop.is_set():
+                        break
+                    continue
+                if item is _DONE:
+                    finished = True
+                else:
+                    pending.append(pool.submit(embed_records_in_worker, item, self.embedding_batch_size))
+        except Exception as e:
+            self.errors.append(e)
+            stop.set()
+        finally:
+            self._put(outbox, _DONE, stop)
+
+    def run(self):
+        if self.recipe_embedding is None and not self.embedding_workers:
+            self.recipe_embedding = RecipeEmbedding(model_name=self.model_name)
+        if self.data_manager is None:
+            self.data_manager = DataManager()
+        if self.ollama_client is None:
+            self.ollama_client = OllamaClient.get_shared(
+                os.getenv("OLLAMA_ENDPOINT", "http://host.docker.internal:11434"))
+
+        stop = threading.Event()
+        parsed = queue.Queue(maxsize=self.queue_size)
+        cleaned = queue.Queue(maxsize=self.queue_size)
+        embedded = queue.Queue(maxsize=self.queue_size)
+
+        pool = None
+        if self.embedding_workers:
+            print(f"Embedding with {self.embedding_workers} worker processes x {self.torch_threads} torch threads")
+            pool = self.create_embedding_pool()
+            embed = threading.Thread(target=self._embed_stage, args=(pool, cleaned, embedded, stop), name="embed", daemon=True)
+        else:
+            embed = threading.Thread(target=self._stage, args=(self.embed_chunk, cleaned, embedded, stop), name="embed", daemon=True)
+
+        threads = [
+            threading.Thread(target=self._source, args=(parsed, stop), name="parse", daemon=True),
+            threading.Thread(target=self._stage, args=(self.clean_chunk, parsed, cleaned, stop), name="clean", daemon=True),
+            embed,
+        ]
+        for thread in threads:
+            thread.start()
+
+        start = time.perf_counter()
+        try:
+            while True:
+                documents = self._get(embedded, stop)
+                if documents is _DONE:
+                    break
+                self.store_chunk(documents)
+                elapsed = time.perf_counter() - start
+                done = self.stats['inserted'] + self.stats['exists'] + self.stats['failed']
+                print(f"Stored {done} recipes ({self.stats['inserted']} new), {self.stats['rows']} rows read "
+                      f"({done / elapsed:.1f} recipes/s)")
+        except Exception as e:
+            self.errors.append(e)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        if self.ollama_client.cache is not None:
+            print(f"Extraction cache: {self.ollama_client.cache.stats()}")
+        if self.errors:
+            raise self.errors[0]
+        return self.stats
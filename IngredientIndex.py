@@ -0,0 +1,113 @@
+import re
+import numpy as np
+
+def _singular(word):
+    """Map plural and singular forms of a word to one token ("tomatoes"/"tomato" -> "tomato", "cherries"/"cherry" -> "cherry")
+
+    Rule-based, not a full stemmer: -oes and -ies/-ie endings are normalized,
+    -ches/-shes/-xes/-sses/-zes lose "es", and other plurals lose the "s".
+    Singular words ending in -ss, -us or -is ("hummus", "couscous") are kept.
+    """
+    if len(word) <= 3 or word.endswith(('ss', 'us', 'is')):
+        return word
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 4 and word.endswith('ie'):
+        return word[:-2] + 'y'
+    if word.endswith('oes'):
+        return word[:-2]
+    if word.endswith(('ches', 'shes', 'xes', 'sses', 'zes')):
+        return word[:-2]
+    if word.endswith('s'):
+        return word[:-1]
+    return word
+
+def ingredient_tokens(ingredient):
+    """Lowercase word tokens of an ingredient name, singularized so "Tomatoes" and "tomato" match"""
+    return [_singular(word) for word in re.findall(r"[a-z]+", str(ingredient).lower())]
+
+def _as_list(ingredients):
+    if ingredients is None:
+        return []
+    if isinstance(ingredients, str):
+        return [part for part in ingredients.split(',') if part.strip()]
+    return list(ingredients)
+
+class IngredientIndex:
+    """Inverted index from ingredient token to the sorted row positions of recipes that use it
+
+    Supports required/excluded ingredients via posting-list intersection and a
+    BM25 score of the user's ingredients for hybrid lexical + vector ranking.
+    A multi-word ingredient such as "olive oil" matches only recipes that contain
+    all of its tokens.
+    """
+
+    def __init__(self, ingredient_lists, size, k1=1.2, b=0.75):
+        self.size = size
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths = np.zeros(size, dtype=np.float32)
+
+        postings = {}
+        for position, ingredients in enumerate(ingredient_lists):
+            counts = {}
+            for ingredient in _as_list(ingredients):
+                for token in ingredient_tokens(ingredient):
+                    counts[token] = counts.get(token, 0) + 1
+            self.doc_lengths[position] = sum(counts.values())
+            for token, count in counts.items():
+                postings.setdefault(token, ([], []))
+                postings[token][0].append(position)
+                postings[token][1].append(count)
+
+        # Positions are appended in increasing order, so every posting list is already sorted
+        self.postings = {token: (np.array(positions, dtype=np.int64), np.array(counts, dtype=np.float32))
+                         for token, (positions, counts) in postings.items()}
+        self.average_length = float(self.doc_lengths.mean()) if size and self.doc_lengths.mean() > 0 else 1.0
+
+    def _phrase_positions(self, ingredient):
+        tokens = ingredient_tokens(ingredient)
+        if not tokens:
+            return None
+        lists = sorted((self.postings.get(token, (np.empty(0, dtype=np.int64),))[0] for token in tokens), key=len)
+        positions = lists[0]
+        for other in lists[1:]:
+            positions = np.intersect1d(positions, other, assume_unique=True)
+        return positions
+
+    def mask(self, required=None, excluded=None):
+        """Rows containing every required ingredient and none of the excluded ones"""
+        mask = np.ones(self.size, dtype=bool)
+        positions = None
+        # Intersect the shortest posting lists first so the candidate set shrinks fastest
+        phrases = [self._phrase_positions(ingredient) for ingredient in _as_list(required)]
+        for phrase in sorted((p for p in phrases if p is not None), key=len):
+            positions = phrase if positions is None else np.intersect1d(positions, phrase, assume_unique=True)
+        if positions is not None:
+            mask[:] = False
+            mask[positions] = True
+        for ingredient in _as_list(excluded):
+            phrase = self._phrase_positions(ingredient)
+            if phrase is not None:
+                mask[phrase] = False
+        return mask
+
+    def bm25(self, query_ingredients, positions):
+        """BM25 score of the query ingredients for each row in `positions`"""
+        positions = np.asarray(positions, dtype=np.int64)
+        scores = np.zeros(len(positions), dtype=np.float32)
+        lengths = self.doc_lengths[positions]
+        norm = self.k1 * (1 - self.b + self.b * lengths / self.average_length)
+        tokens = {token for ingredient in _as_list(query_ingredients) for token in ingredient_tokens(ingredient)}
+        for token in tokens:
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            token_positions, counts = posting
+            idf = np.log(1 + (self.size - len(token_positions) + 0.5) / (len(token_positions) + 0.5))
+            slots = np.searchsorted(token_positions, positions)
+            slots = np.minimum(slots, len(token_positions) - 1)
+            present = token_positions[slots] == positions
+            tf = np.where(present, counts[slots], 0.0)
+            scores += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
@@ -0,0 +1,105 @@
+import gzip
+import io
+import json
+import os
+from itertools import chain, islice
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# A crash mid-write leaves a compressed file without its end marker
+TRUNCATED_ERRORS = (EOFError, zstandard.ZstdError) if zstandard else (EOFError,)
+
+def open_jsonl(path, mode='r'):
+    """Text stream over path, compressed according to its extension: .gz with gzip, .zst with zstandard
+
+    Appending to a compressed file adds a new gzip member / zstd frame, which
+    readers decode as one continuous stream.
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("zstandard is required for .zst files: pip install zstandard")
+        if mode == 'r':
+            stream = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True)
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(open(path, mode + 'b'))
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+def _ends_mid_line(path):
+    if not os.path.exists(path) or not os.path.getsize(path):
+        return False
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b'\n'
+
+class JsonlWriter:
+    """Writes one JSON record per line, so a file can be appended to without being rewritten"""
+
+    def __init__(self, path, append=False):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        # An interrupted plain-text write can leave a partial last line; start on a fresh one
+        partial = append and not path.endswith(('.gz', '.zst')) and _ends_mid_line(path)
+        self.file = open_jsonl(path, 'a' if append else 'w')
+        if partial:
+            self.file.write('\n')
+        self.count = 0
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.count += 1
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+        return self.count
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_jsonl(path, records, append=False):
+    """Write (or append) an iterable of records to path; returns how many were written"""
+    with JsonlWriter(path, append=append) as writer:
+        return writer.write_many(records)
+
+def read_jsonl(path, start=0):
+    """Yield the records of a JSONL file one at a time, skipping the first `start` lines
+
+    Lines are counted whether or not they hold a record, so `start` is a plain
+    line offset to resume from. A file holding a single JSON array (the old
+    output format) is loaded whole and sliced instead. An unreadable line or a
+    truncated compressed tail, as left by an interrupted writer, is reported
+    and skipped.
+    """
+    with open_jsonl(path) as f:
+        first = f.readline()
+        if first.lstrip().startswith('['):
+            yield from islice(json.loads(first + f.read()), start, None)
+            return
+        number = 0
+        try:
+            for number, line in enumerate(chain([first], f), 1):
+                if number <= start or not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    print(f"Skipping unreadable line {number} of {path}: {e}")
+        except TRUNCATED_ERRORS as e:
+            print(f"{path} ends early after line {number}: {e}")
@@ -0,0 +1,33 @@
+import threading
+from sentence_transformers import SentenceTransformer
+
+class ModelRegistry:
+    """Loads each SentenceTransformer once per process and shares it between callers"""
+
+    _models = {}
+    _warmed = set()
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, model_name='all-MiniLM-L6-v2'):
+        model = cls._models.get(model_name)
+        if model is None:
+            with cls._lock:
+                model = cls._models.get(model_name)
+                if model is None:
+                    print(f"Loading embedding model {model_name}")
+                    model = SentenceTransformer(model_name)
+                    cls._models[model_name] = model
+        return model
+
+    @classmethod
+    def warm_up(cls, model_names=('all-MiniLM-L6-v2',)):
+        """Load the models and run one encode so the first real query skips lazy initialization"""
+        for model_name in model_names:
+            if model_name not in cls._warmed:
+                cls.get(model_name).encode("warm up")
+                cls._warmed.add(model_name)
+
+    @classmethod
+    def loaded_models(cls):
+        return list(cls._models)
@@ -0,0 +1,99 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from ExtractionCache import ExtractionCache
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Bump whenever the extraction prompt changes so cached answers from the old prompt are not reused
+PROMPT_VERSION = 1
+
+class OllamaClient:
+    """Keep-alive Ollama client with bounded concurrency, timeouts and retries with backoff"""
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, endpoint=None, model="llama3.2:3b", max_concurrency=8, timeout=60,
+                 max_retries=3, backoff=0.5, cache=None):
+        load_dotenv()
+        self.endpoint = (endpoint or os.getenv("OLLAMA_ENDPOINT") or "http://localhost:11434").rstrip('/')
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.cache = cache
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="ollama")
+
+    @classmethod
+    def get_shared(cls, endpoint=None, **kwargs):
+        """Return the process-wide client for an endpoint, creating it on first use
+
+        Unlike a bare OllamaClient, the shared client caches extractions on disk by default.
+        """
+        with cls._shared_lock:
+            client = cls._shared.get(endpoint)
+            if client is None:
+                kwargs.setdefault('cache', ExtractionCache())
+                client = cls(endpoint=endpoint, **kwargs)
+                cls._shared[endpoint] = client
+            return client
+
+    def generate(self, prompt, options=None):
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "options": options or {"temperature": 0.1, "max_tokens": 200}
+        }
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(f"{self.endpoint}/api/generate", json=payload, timeout=self.timeout)
+                if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                    raise requests.HTTPError(f"{response.status_code} from Ollama", response=response)
+                response.raise_for_status()
+                return response.json().get('response', '').strip()
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                retryable = e.response is None or e.response.status_code in RETRY_STATUS_CODES
+                if not retryable or attempt == self.max_retries:
+                    raise
+                # Exponential backoff with jitter so concurrent workers do not retry in lockstep
+                time.sleep(self.backoff * (2 ** attempt) * (1 + random.random()))
+
+    def extract_ingredients(self, text):
+        if self.cache is not None:
+            cached = self.cache.get(text, self.model, PROMPT_VERSION)
+            if cached is not None:
+                return cached
+        prompt = f"Extract only core ingredient names from: {text}\n \
+        Return only ingredient names separated by commas, if you could not \
+        get the ingredient names then return empty string, no other text:"
+        try:
+            result = self.generate(prompt)
+            ingredients = [ing.strip().title() for ing in result.split(',') if ing.strip()]
+        except Exception as e:
+            print(f'Ollama request failed: {e}')
+            return []
+        # Only successful generations are cached so failures are retried on the next run
+        if self.cache is not None:
+            self.cache.put(text, self.model, PROMPT_VERSION, ingredients)
+        return ingredients
+
+    def extract_many(self, texts):
+        """Run extract_ingredients over many texts concurrently, preserving order"""
+        return list(self.executor.map(self.extract_ingredients, texts))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
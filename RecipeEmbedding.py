@@ -1,13 +1,24 @@
+import time
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from ModelRegistry import ModelRegistry
+from EmbeddingCache import EmbeddingCache
+from EmbeddingBatcher import EmbeddingBatcher
+from EmbeddingCodec import encode_embedding
 import ast
 
 class RecipeEmbedding:
 
-    def __init__(self, model_name: str = 'all-MiniLM-L6-v2'):
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', cache=None, embedding_codec=None, batcher=None):
         self.model_name = model_name
-        self.model = SentenceTransformer(model_name)
+        self.embedding_codec = embedding_codec
+        # Pass cache=False to always run the model
+        self.cache = EmbeddingCache.get_shared() if cache is None else (cache or None)
+        self.model = ModelRegistry.get(model_name)
+        # Pass batcher=False to encode single queries on the calling thread
+        self.batcher = EmbeddingBatcher.get_shared(model_name) if batcher is None else (batcher or None)
         self.embedding_dim = self.model.get_sentence_embedding_dimension()
+        self.last_throughput = None
+        self.last_batch = None
 
     def _parse_ingredients(self, ingredient_list):
         if isinstance(ingredient_list, str):
@@ -20,13 +31,62 @@ class RecipeEmbedding:
     def _ingredients_to_text(self, ingredients):
         return ", ".join(ingredients)
 
-    def get_embedding(self, ingredient_list):
+    def _embedding_text(self, ingredient_list):
         ingredients = self._parse_ingredients(ingredient_list)
         cleaned = self._clean_ingredients(ingredients)
-        text = self._ingredients_to_text(cleaned)
-        embedding = self.model.encode(text)
+        return self._ingredients_to_text(cleaned)
+
+    def get_embedding(self, ingredient_list):
+        text = self._embedding_text(ingredient_list)
+        if self.cache is not None:
+            embedding = self.cache.get(self.model_name, text)
+            if embedding is not None:
+                return embedding.tolist()
+        embedding = self.batcher.encode(text) if self.batcher is not None else self.model.encode(text)
+        if self.cache is not None:
+            self.cache.put(self.model_name, text, embedding)
         return embedding.tolist()
 
+    def get_embeddings_batch(self, ingredient_lists, batch_size=64, show_progress=False):
+        """Encode many ingredient lists in batches and return an (n, dim) float32 array"""
+        texts = [self._embedding_text(ingredients) for ingredients in ingredient_lists]
+        embeddings = np.empty((len(texts), self.embedding_dim), dtype=np.float32)
+        if not texts:
+            return embeddings
+        start = time.perf_counter()
+
+        # Only texts not already cached go through the model, each distinct text once
+        missing = {}
+        for i, text in enumerate(texts):
+            cached = self.cache.get(self.model_name, text) if self.cache is not None else None
+            if cached is not None:
+                embeddings[i] = cached
+            else:
+                missing.setdefault(text, []).append(i)
+
+        if missing:
+            unique_texts = list(missing)
+            encoded = self.model.encode(unique_texts, batch_size=batch_size, show_progress_bar=show_progress,
+                                        convert_to_numpy=True).astype(np.float32, copy=False)
+            for text, vector in zip(unique_texts, encoded):
+                embeddings[missing[text]] = vector
+            if self.cache is not None:
+                self.cache.put_many(self.model_name, unique_texts, encoded)
+
+        elapsed = time.perf_counter() - start
+        self.last_throughput = len(texts) / elapsed if elapsed > 0 else float('inf')
+        from_cache = len(texts) - sum(len(positions) for positions in missing.values())
+        self.last_batch = {"count": len(texts), "from_cache": from_cache, "seconds": elapsed}
+        return embeddings
+
+    def last_batch_summary(self):
+        """One-line report of the latest get_embeddings_batch call, for ingestion logs and benchmarks"""
+        if self.last_batch is None:
+            return "No batch encoded yet"
+        batch = self.last_batch
+        return (f"Encoded {batch['count']} recipes ({batch['from_cache']} from cache) in {batch['seconds']:.2f}s "
+                f"({self.last_throughput:.1f} recipes/s)")
+
     def calculate_similarity(self, embedding1, embedding2):
         vec1 = np.array(embedding1)
         vec2 = np.array(embedding2)
@@ -47,19 +107,32 @@ class RecipeEmbedding:
         similarities.sort(key=lambda x: x['similarity_score'], reverse=True)
         return similarities[:top_k]
 
-    def prepare_for_couchbase(self, recipe_id, ingredient_list, recipe_name, additional_fields):
+    def _build_document(self, recipe_id, ingredient_list, recipe_name, embedding, additional_fields):
         ingredients = self._parse_ingredients(ingredient_list)
-        embedding = self.get_embedding(ingredient_list)
         document = {
             "type": "recipe",
             "recipe_id": recipe_id,
             "recipe_name": recipe_name,
             "ingredients": ingredients,
             "ingredients_text": self._ingredients_to_text(self._clean_ingredients(ingredients)),
-            "embedding": embedding,
             "embedding_model": self.model_name,
             "embedding_dim": self.embedding_dim
         }
+        document.update(encode_embedding(embedding, self.embedding_codec))
         if additional_fields:
             document.update(additional_fields)
-        return document
\ No newline at end of file
+        return document
+
+    def prepare_for_couchbase(self, recipe_id, ingredient_list, recipe_name, additional_fields):
+        embedding = self.get_embedding(ingredient_list)
+        return self._build_document(recipe_id, ingredient_list, recipe_name, embedding, additional_fields)
+
+    def prepare_for_couchbase_batch(self, recipes, batch_size=64):
+        """Build Couchbase documents for dicts with recipe_id, ingredient_list, recipe_name and additional_fields"""
+        recipes = list(recipes)
+        embeddings = self.get_embeddings_batch([recipe['ingredient_list'] for recipe in recipes], batch_size=batch_size)
+        return [
+            self._build_document(recipe['recipe_id'], recipe['ingredient_list'], recipe['recipe_name'],
+                                 embedding, recipe.get('additional_fields'))
+            for recipe, embedding in zip(recipes, embeddings)
+        ]
@@ -0,0 +1,484 @@
+import copy
+import os
+import threading
+import time
+import numpy as np
+from AnnIndex import IVFIndex
+from EmbeddingCodec import EMBEDDING_FIELDS, decode_embedding
+from FilterIndex import RecipeFilterIndex, SOURCE_FIELDS
+from IngredientIndex import IngredientIndex
+
+class RecipeIndex:
+    """Contiguous float32 embedding matrix with a parallel id array and columnar metadata
+
+    When the matrix is a read-only memmap of a snapshot, rows added later go to
+    a small `delta` array and replaced snapshot rows to `patch_rows`, so the
+    mapping stays shared between processes instead of being copied.
+    """
+
+    def __init__(self, embedding_dim=None):
+        self.embedding_dim = embedding_dim
+        self.ids = np.empty(0, dtype=object)
+        self.matrix = np.empty((0, embedding_dim or 0), dtype=np.float32)
+        self.delta = np.empty((0, embedding_dim or 0), dtype=np.float32)
+        self.patch_positions = np.empty(0, dtype=np.int64)
+        self.patch_rows = np.empty((0, embedding_dim or 0), dtype=np.float32)
+        self.columns = {}
+        self.positions = {}
+        self.last_created_at = None
+        self.ann = None
+        self._filter_index = None
+        self._ingredient_index = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    @classmethod
+    def from_documents(cls, documents, id_field='recipe_id'):
+        """Build an index from recipe documents, skipping those without embeddings"""
+        index = cls()
+        index.add_documents(documents, id_field=id_field)
+        return index
+
+    @classmethod
+    def from_matrix(cls, ids, matrix, columns=None, normalized=False):
+        """Build an index directly from an (n, dim) embedding matrix
+
+        With normalized=True the matrix is used as-is, so a read-only memmap stays shared and uncopied.
+        """
+        matrix = np.asarray(matrix, dtype=np.float32) if not isinstance(matrix, np.memmap) else matrix
+        index = cls(embedding_dim=matrix.shape[1])
+        index.matrix = matrix if normalized else np.ascontiguousarray(cls._normalize(matrix))
+        index.ids = np.empty(len(ids), dtype=object)
+        index.ids[:] = list(ids)
+        index.columns = {field: list(values) for field, values in (columns or {}).items()}
+        index.positions = {recipe_id: position for position, recipe_id in enumerate(index.ids)}
+        return index
+
+    def add_documents(self, documents, id_field='recipe_id'):
+        """Append new documents and overwrite rows whose id is already indexed"""
+        new_rows = {}
+        updates = {}
+        for document in documents:
+            if not isinstance(document, dict) or 'embedding' not in document:
+                continue
+            embedding = decode_embedding(document)
+            if self.embedding_dim is None:
+                self.embedding_dim = len(embedding)
+            if len(embedding) != self.embedding_dim:
+                print(f"Skipping recipe {document.get(id_field)}: embedding dim {len(embedding)} != {self.embedding_dim}")
+                continue
+            recipe_id = document.get(id_field)
+            if recipe_id in self.positions:
+                updates[self.positions[recipe_id]] = (document, embedding)
+            else:
+                new_rows[recipe_id] = (document, embedding)
+            created_at = document.get('created_at')
+            if created_at and (self.last_created_at is None or created_at > self.last_created_at):
+                self.last_created_at = created_at
+
+        if not new_rows and not updates:
+            return 0
+
+        # Build replacements off to the side rather than mutating shared arrays
+        columns = {field: list(values) for field, values in self.columns.items()}
+        for position, (document, embedding) in updates.items():
+            self._set_metadata(columns, position, document, len(self.ids))
+        block = self._normalize(np.stack([embedding for _, embedding in new_rows.values()])) if new_rows else None
+
+        matrix, delta = self.matrix, self.delta
+        patch_positions, patch_rows = self.patch_positions, self.patch_rows
+        if isinstance(matrix, np.memmap):
+            base = len(matrix)
+            delta_updates = {position: update for position, update in updates.items() if position >= base}
+            if delta_updates:
+                delta = delta.copy()
+                for position, (_, embedding) in delta_updates.items():
+                    delta[position - base] = self._normalize(embedding.reshape(1, -1))[0]
+            if block is not None:
+                delta = np.ascontiguousarray(np.vstack([delta, block])) if len(delta) else np.ascontiguousarray(block)
+            if len(delta_updates) < len(updates):
+                patches = dict(zip(patch_positions.tolist(), patch_rows))
+                patches.update({position: self._normalize(embedding.reshape(1, -1))[0]
+                                for position, (_, embedding) in updates.items() if position < base})
+                patch_positions = np.array(sorted(patches), dtype=np.int64)
+                patch_rows = np.stack([patches[position] for position in patch_positions]).astype(np.float32)
+        else:
+            matrix = matrix.copy() if updates else matrix
+            for position, (_, embedding) in updates.items():
+                matrix[position] = self._normalize(embedding.reshape(1, -1))[0]
+            if block is not None:
+                matrix = np.ascontiguousarray(np.vstack([matrix, block])) if len(self.ids) else np.ascontiguousarray(block)
+
+        ids = self.ids
+        if new_rows:
+            new_ids = np.empty(len(new_rows), dtype=object)
+            new_ids[:] = list(new_rows)
+            ids = np.concatenate([ids, new_ids])
+            size = len(ids)
+            for position, (document, _) in enumerate(new_rows.values(), start=len(self.ids)):
+                self._set_metadata(columns, position, document, size)
+
+        for field, values in columns.items():
+            values.extend([None] * (len(ids) - len(values)))
+
+        positions = dict(self.positions)
+        positions.update({recipe_id: position for position, recipe_id in enumerate(ids[len(self.ids):], start=len(self.ids))})
+
+        changed = np.array(list(updates) + list(range(len(self.ids), len(ids))), dtype=np.int64)
+        self.matrix, self.delta, self.patch_positions, self.patch_rows = matrix, delta, patch_positions, patch_rows
+        self.ids, self.columns, self.positions = ids, columns, positions
+        self._filter_index = None
+        self._ingredient_index = None
+        if self.ann is not None:
+            # Searches still running on an older copy of this index keep probing the lists they started with
+            self.ann = copy.copy(self.ann)
+            self.ann.add(changed, self.rows(changed))
+        return len(new_rows) + len(updates)
+
+    @property
+    def delta_size(self):
+        """Rows held outside the base matrix, as added or replaced rows"""
+        return len(self.delta) + len(self.patch_positions)
+
+    def rows(self, positions=None):
+        """Normalized embeddings of `positions` (every row by default) across the base, delta and patches"""
+        if positions is None:
+            if not self.delta_size:
+                return self.matrix
+            positions = np.arange(len(self.ids))
+        positions = np.asarray(positions, dtype=np.int64)
+        if not self.delta_size:
+            return self.matrix[positions]
+        base = len(self.matrix)
+        rows = np.empty((len(positions), self.embedding_dim), dtype=np.float32)
+        in_base = positions < base
+        rows[in_base] = self.matrix[positions[in_base]]
+        rows[~in_base] = self.delta[positions[~in_base] - base]
+        if len(self.patch_positions):
+            slots = np.minimum(np.searchsorted(self.patch_positions, positions), len(self.patch_positions) - 1)
+            patched = self.patch_positions[slots] == positions
+            rows[patched] = self.patch_rows[slots[patched]]
+        return rows
+
+    def _scores(self, queries, positions=None):
+        """Dot products of normalized (q, dim) queries with every row (or `positions`), as (q, rows)"""
+        if positions is not None or not self.delta_size:
+            return queries @ self.rows(positions).T
+        # Score the shared base in place rather than gathering it into a copy
+        scores = queries @ self.matrix.T
+        if len(self.delta):
+            scores = np.hstack([scores, queries @ self.delta.T])
+        if len(self.patch_positions):
+            scores[:, self.patch_positions] = queries @ self.patch_rows.T
+        return scores
+
+    def build_ann(self, **params):
+        """Attach an IVF index; searches then score only the rows it suggests"""
+        self.ann = IVFIndex(**params).build(self.rows()) if len(self.ids) else None
+        return self.ann
+
+    @staticmethod
+    def _set_metadata(columns, position, document, size):
+        for field, value in document.items():
+            if field in EMBEDDING_FIELDS:
+                continue
+            values = columns.setdefault(field, [])
+            if len(values) <= position:
+                values.extend([None] * (size - len(values)))
+            values[position] = value
+
+    def document(self, position):
+        """Reassemble the display metadata of one row as a recipe dict"""
+        columns = self.columns
+        return {field: values[position] for field, values in columns.items() if values[position] is not None}
+
+    def score(self, query_embedding, positions=None):
+        """Cosine similarity of the query against every row (or just `positions`) in one matrix-vector product"""
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(query)
+        size = len(self.ids) if positions is None else len(positions)
+        if norm == 0 or not size:
+            return np.zeros(size, dtype=np.float32)
+        return self._scores((query / norm).reshape(1, -1), positions)[0]
+
+    def top_k(self, scores, top_k, threshold):
+        """Row positions of the best `top_k` scores at or above `threshold`, best first"""
+        if top_k <= 0 or not len(scores):
+            return np.empty(0, dtype=np.int64)
+        if top_k < len(scores):
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(len(scores))
+        candidates = candidates[scores[candidates] >= threshold]
+        return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+    @property
+    def filter_index(self):
+        """Secondary indexes over the metadata columns, rebuilt lazily after the index changes"""
+        if self._filter_index is None:
+            self._filter_index = RecipeFilterIndex(self.columns, len(self.ids))
+        return self._filter_index
+
+    @property
+    def ingredient_index(self):
+        """Inverted ingredient index over the `ingredients` column, rebuilt lazily after the index changes"""
+        if self._ingredient_index is None:
+            self._ingredient_index = IngredientIndex(self.columns.get('ingredients') or [None] * len(self.ids), len(self.ids))
+        return self._ingredient_index
+
+    def candidate_mask(self, filters=None, required=None, excluded=None):
+        """Rows allowed by metadata filters and required/excluded ingredients, or None when nothing is pruned"""
+        mask = self.filter_index.mask(filters) if filters else None
+        if required or excluded:
+            ingredients = self.ingredient_index.mask(required, excluded)
+            mask = ingredients if mask is None else mask & ingredients
+        return mask
+
+    def search(self, query_embedding, top_k=3, threshold=0.1, nprobe=None, filters=None,
+               required=None, excluded=None, query_ingredients=None, lexical_weight=0.0):
+        """Best rows as (position, cosine); `threshold` always applies to the cosine similarity
+
+        With a lexical_weight rows are ranked by (1 - w) * cosine + w * BM25 of
+        `query_ingredients`, with BM25 scaled to [0, 1] over the candidates, and
+        returned as (position, cosine, blended score).
+        """
+        mask = self.candidate_mask(filters, required, excluded)
+        # Selective filters leave few enough rows to score exactly, which beats IVF recall
+        use_ann = self.ann is not None and (mask is None or mask.sum() > 0.1 * len(self.ids))
+
+        if use_ann:
+            candidates = self.ann.candidates(query_embedding, nprobe)
+            # Guard against positions this copy of the index does not have rows for
+            candidates = candidates[candidates < len(self.ids)]
+            if mask is not None:
+                candidates = candidates[mask[candidates]]
+        elif mask is not None:
+            candidates = np.flatnonzero(mask)
+        else:
+            candidates = None
+        scores = self.score(query_embedding, candidates)
+
+        if lexical_weight and query_ingredients:
+            positions = np.arange(len(self.ids)) if candidates is None else candidates
+            lexical = self.ingredient_index.bm25(query_ingredients, positions)
+            if len(lexical) and lexical.max() > 0:
+                lexical /= lexical.max()
+            ranking = (1 - lexical_weight) * scores + lexical_weight * lexical
+            ranking[scores < threshold] = -np.inf
+            best = [i for i in self.top_k(ranking, top_k, -np.inf) if np.isfinite(ranking[i])]
+            positions = best if candidates is None else candidates[best]
+            return [(int(position), float(scores[i]), float(ranking[i])) for position, i in zip(positions, best)]
+
+        best = self.top_k(scores, top_k, threshold)
+        if candidates is None:
+            return [(int(position), float(scores[position])) for position in best]
+        return [(int(candidates[i]), float(scores[i])) for i in best]
+
+    def search_batch(self, query_embeddings, top_k=3, threshold=0.1, filters=None, max_scores=32 * 1024 * 1024):
+        """Exact top-k for many queries at once, one matrix-matrix product per chunk of queries
+
+        Queries are chunked so a chunk's score matrix holds at most `max_scores` floats.
+        Returns one [(position, score), ...] list per query.
+        """
+        queries = self._normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        mask = self.candidate_mask(filters)
+        candidates = None if mask is None else np.flatnonzero(mask)
+        size = len(self.ids) if candidates is None else len(candidates)
+        results = []
+        if not size or top_k <= 0:
+            return [[] for _ in queries]
+
+        # A filtered subset is gathered once, not once per chunk
+        matrix = None if candidates is None else self.rows(candidates)
+        chunk_size = max(1, max_scores // size)
+        k = min(top_k, size)
+        for start in range(0, len(queries), chunk_size):
+            chunk = queries[start:start + chunk_size]
+            scores = self._scores(chunk) if matrix is None else chunk @ matrix.T
+            if k < scores.shape[1]:
+                best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                best = np.tile(np.arange(scores.shape[1]), (len(scores), 1))
+            best_scores = np.take_along_axis(scores, best, axis=1)
+            order = np.argsort(-best_scores, axis=1, kind='stable')
+            best = np.take_along_axis(best, order, axis=1)
+            best_scores = np.take_along_axis(best_scores, order, axis=1)
+            for rows, row_scores in zip(best, best_scores):
+                keep = row_scores >= threshold
+                positions = rows[keep] if candidates is None else candidates[rows[keep]]
+                results.append([(int(position), float(score)) for position, score in zip(positions, row_scores[keep])])
+        return results
+
+class SharedRecipeIndex:
+    """Process-wide RecipeIndex loaded once from Couchbase and refreshed by created_at delta"""
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, data_manager, refresh_interval=60, backend=None, ann_params=None, snapshot=None,
+                 lazy=True, projected_fields=SOURCE_FIELDS + ('ingredients',)):
+        self.data_manager = data_manager
+        # Lazy indexes hold only keys and embeddings (plus `projected_fields`) and
+        # multi-get the full documents for the top-k results of each search
+        self.lazy = lazy
+        self.projected_fields = tuple(projected_fields)
+        self.id_field = 'id' if lazy else 'recipe_id'
+        self.refresh_interval = refresh_interval
+        self.backend = backend or os.getenv("RECIPE_INDEX_BACKEND", "exact")
+        self.ann_params = ann_params or {
+            "nlist": int(os.getenv("IVF_NLIST", 256)),
+            "nprobe": int(os.getenv("IVF_NPROBE", 16)),
+        }
+        if snapshot is None and os.getenv("RECIPE_SNAPSHOT_DIR"):
+            from EmbeddingSnapshot import EmbeddingSnapshot
+            snapshot = EmbeddingSnapshot()
+        self.snapshot = snapshot
+        # Past this fraction of rows outside the snapshot, export a new one and map that instead
+        self.max_delta = float(os.getenv("SNAPSHOT_MAX_DELTA", 0.05))
+        self.index = RecipeIndex()
+        self.loaded_at = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def get(cls, data_manager_factory=None, refresh_interval=60):
+        """Return the process singleton, creating and loading it on first use"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                if data_manager_factory is None:
+                    from DataManager import DataManager
+                    data_manager_factory = DataManager
+                cls._instance = cls(data_manager_factory(), refresh_interval)
+        cls._instance.ensure_fresh()
+        return cls._instance
+
+    @classmethod
+    def reset(cls):
+        with cls._instance_lock:
+            cls._instance = None
+
+    @property
+    def projection(self):
+        return ["id", *self.projected_fields] if self.lazy else ["*"]
+
+    def _fetch(self, since=None):
+        if self.lazy:
+            return self.data_manager.read_embeddings(fields=self.projected_fields, since=since)
+        if since is None:
+            return self.data_manager.read_all()
+        return self.data_manager.read_since(since)
+
+    def scan(self):
+        """A new RecipeIndex over the whole collection, under this index's projection"""
+        index = RecipeIndex()
+        index.add_documents(self._fetch(), id_field=self.id_field)
+        return index
+
+    def export_snapshot(self, index=None):
+        """Write `index` (a fresh scan by default) to the snapshot, stamped with the projection load() checks"""
+        index = self.scan() if index is None else index
+        return self.snapshot.export(index, projection=self.projection)
+
+    def _compact(self, index):
+        """Fold a large delta into a fresh snapshot, so processes share its pages again"""
+        if self.snapshot is None or not isinstance(index.matrix, np.memmap) or \
+                index.delta_size <= self.max_delta * len(index):
+            return index
+        self.export_snapshot(index)
+        compacted = self.snapshot.load()
+        if compacted is None or len(compacted) != len(index):
+            return index
+        # Positions are unchanged, so the IVF lists still apply
+        compacted.ann = index.ann
+        return compacted
+
+    def load(self):
+        """Start from the on-disk snapshot when it is current, otherwise scan the collection once"""
+        with self._lock:
+            index = None
+            if self.snapshot is not None and not self.snapshot.is_stale(projection=self.projection):
+                index = self.snapshot.load()
+            if index is not None:
+                # Catch up on anything written since the snapshot was exported
+                if index.last_created_at:
+                    index.add_documents(self._fetch(since=index.last_created_at), id_field=self.id_field)
+                    index = self._compact(index)
+            else:
+                index = self.scan()
+                if self.snapshot is not None and len(index):
+                    self.export_snapshot(index)
+            if self.backend == "ivf":
+                index.build_ann(**self.ann_params)
+            self.index = index
+            self.loaded_at = time.monotonic()
+            print(f"Loaded {len(index)} recipes into the shared index")
+
+    def refresh(self):
+        """Pull only documents created after the newest one already indexed"""
+        with self._lock:
+            documents = self._fetch(since=self.index.last_created_at)
+            # Update a shallow copy so searches already holding self.index are unaffected
+            index = copy.copy(self.index)
+            changed = index.add_documents(documents, id_field=self.id_field)
+            self.index = self._compact(index) if changed else index
+            self.loaded_at = time.monotonic()
+            if changed:
+                print(f"Refreshed shared index: {changed} new or updated recipes")
+            return changed
+
+    def ensure_fresh(self):
+        with self._lock:
+            if self.loaded_at is None:
+                self.load()
+            elif time.monotonic() - self.loaded_at >= self.refresh_interval:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Failed to refresh recipe index, serving stale data: {e}")
+
+    def search(self, query_embedding, top_k=3, threshold=0.1, **options):
+        """Same options as RecipeIndex.search; returns (recipe, cosine) or, with a lexical_weight, (recipe, cosine, blended score)"""
+        index = self.index
+        results = index.search(query_embedding, top_k=top_k, threshold=threshold, **options)
+        if not self.lazy:
+            return [(index.document(position), *scores) for position, *scores in results]
+
+        return self._hydrate(index, [results])[0]
+
+    def search_batch(self, query_embeddings, top_k=3, threshold=0.1, filters=None):
+        """RecipeIndex.search_batch with recipes attached; lazy indexes multi-get all winners in one call"""
+        index = self.index
+        batch = index.search_batch(query_embeddings, top_k=top_k, threshold=threshold, filters=filters)
+        if not self.lazy:
+            return [[(index.document(position), similarity) for position, similarity in results]
+                    for results in batch]
+        return self._hydrate(index, batch)
+
+    def _hydrate(self, index, batch):
+        keys = {index.ids[position] for results in batch for position, *_ in results}
+        documents = self.data_manager.get_many(list(keys))
+        hydrated = []
+        for results in batch:
+            hydrated.append([
+                ({field: value for field, value in documents[index.ids[position]].items()
+                  if field not in EMBEDDING_FIELDS}, *scores)
+                for position, *scores in results if index.ids[position] in documents
+            ])
+        return hydrated
+
+class InMemoryVectorBackend:
+    """In-process stand-in for DataManager.vector_search, for tests and running without a Search service"""
+
+    def __init__(self, documents, id_field='recipe_id'):
+        self.index = RecipeIndex.from_documents(documents, id_field=id_field)
+
+    def vector_search(self, embedding, k=3, filters=None):
+        """Same contract as DataManager.vector_search: [(key, document, score)], best first"""
+        results = self.index.search(embedding, top_k=k, threshold=-np.inf, filters=filters)
+        return [(self.index.ids[position], self.index.document(position), score) for position, score in results]
@@ -1,21 +1,36 @@
-import json
+import argparse
+import hashlib
+import os
 import uuid
 import random
 from datetime import datetime
+from itertools import islice
 from RecipeEmbedding import RecipeEmbedding
 from DataManager import DataManager
+from OllamaClient import OllamaClient
+from EmbeddingCodec import decode_embedding, encode_embedding
+from CrawlState import CrawlState, default_path
+from JsonLines import JsonlWriter, read_jsonl, write_jsonl
 
 class RecipeProcessing:
-    def __init__(self, model_name: str = 'all-MiniLM-L6-v2'):
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', crawl_state: CrawlState = None):
         self.recipe_embedding = RecipeEmbedding(model_name)
+        # Stored recipes are acknowledged here, so the next incremental crawl can skip them
+        self.crawl_state = crawl_state
         self.processed_recipes = []
+        # Recipes the crawl state saw before with different content; stored with upsert instead of insert
+        self.changed_recipe_ids = set()
         self.data_manager = None
+        self.ollama_client = OllamaClient.get_shared()
     
-    def load_scraped_data(self, json_file_path: str):
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+    def load_scraped_data(self, json_file_path: str, start: int = 0):
+        # Generator over the JSONL lines (or an old JSON array file) from line `start` on
+        return read_jsonl(json_file_path, start)
     
-    def generate_recipe_id(self, recipe_index: int):
+    def generate_recipe_id(self, recipe_index: int, url: str = None):
+        # Incremental crawls only pass on new and changed pages, so crawled recipes need an id tied to their URL
+        if url:
+            return f"recipe_{hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]}"
         return f"recipe_{10001 + recipe_index}"
     
     def clean_ingredients(self, ingredients: list):
@@ -33,8 +48,6 @@ class RecipeProcessing:
         return cleaned
     
     def extract_ingredient_names_only(self, ingredients: list):
-        import requests
-        
         if not ingredients:
             return []
         
@@ -43,26 +56,7 @@ class RecipeProcessing:
         if not ingredients_text.strip():
             return []
         
-        def clean_single(text):
-            prompt = f"Extract only core ingredient names from: {text}\n \
-            Return only ingredient names separated by commas, if you could not \
-            get the ingredient names then return empty string, no other text:"
-            payload = {
-                "model": "llama3.2:3b",
-                "prompt": prompt,
-                "stream": False,
-                "options": {"temperature": 0.1, "max_tokens": 200}
-            }
-            try:
-                response = requests.post("http://localhost:11434/api/generate", json=payload)
-                result = response.json().get('response', '').strip()
-                ingredients = [ing.strip().title() for ing in result.split(',') if ing.strip()]
-                return ingredients if ingredients else []
-            except Exception as e:
-                print(f"Error calling Llama model: {e}")
-                return []
-        
-        clean_names = clean_single(ingredients_text)
+        clean_names = self.ollama_client.extract_ingredients(ingredients_text)
         
         seen = set()
         unique_names = []
@@ -117,7 +111,8 @@ class RecipeProcessing:
             return f"c({', '.join(quantities)})"
         return ""
     
-    def process_single_recipe(self, recipe_data: dict):
+    def process_single_recipe(self, recipe_data: dict, clean_ingredient_names: list = None, recipe_index: int = None,
+                              embedding=None):
         title = recipe_data.get('title', 'Unknown Recipe')
         raw_ingredients = self.clean_ingredients(recipe_data.get('ingredients', []))
         
@@ -125,13 +120,17 @@ class RecipeProcessing:
             print(f"Warning: No valid ingredients found for recipe '{title}', skipping...")
             return None
         
-        clean_ingredient_names = self.extract_ingredient_names_only(raw_ingredients)
+        if clean_ingredient_names is None:
+            clean_ingredient_names = self.extract_ingredient_names_only(raw_ingredients)
         if not clean_ingredient_names:
             print(f"Warning: No clean ingredient names extracted for recipe '{title}', skipping...")
             return None
         
-        recipe_id = self.generate_recipe_id(len(self.processed_recipes))
-        embedding = self.recipe_embedding.get_embedding(clean_ingredient_names)
+        if recipe_index is None:
+            recipe_index = len(self.processed_recipes)
+        recipe_id = self.generate_recipe_id(recipe_index, recipe_data.get('url'))
+        if embedding is None:
+            embedding = self.recipe_embedding.get_embedding(clean_ingredient_names)
         ingredients_text = ", ".join(clean_ingredient_names)
         
         prep_time_numeric = self.extract_numeric_value(recipe_data.get('prep_time'))
@@ -150,37 +149,118 @@ class RecipeProcessing:
             "recipe_name": title,
             "ingredients": clean_ingredient_names,
             "ingredients_text": ingredients_text,
-            "embedding": embedding,
             "embedding_model": self.recipe_embedding.model_name,
             "embedding_dim": self.recipe_embedding.embedding_dim,
             "prep_time": prep_time_iso,
             "total_time": total_time_iso,
+            "total_time_minutes": (prep_time_numeric or 0) + (cook_time_numeric or 0) or None,
             "images": images_formatted,
             "recipe_category": recipe_data.get('category', ''),
             "ingredient_quantities": ingredient_quantities_formatted,
             "aggregated_rating": None,
             "calories": random_calories,
+            "source_url": recipe_data.get('url'),
             "created_at": datetime.now().isoformat()
         }
+        processed_recipe.update(encode_embedding(embedding, self.recipe_embedding.embedding_codec))
         
         return processed_recipe
     
-    def process_all_recipes(self, json_file_path: str):
-        scraped_data = self.load_scraped_data(json_file_path)
+    def process_batch(self, batch: list, first_line: int = 0):
+        """Process scraped recipes into self.processed_recipes; first_line is the input line of batch[0]"""
+        # The LLM calls dominate processing time, so issue them concurrently up front
+        clean_names = list(self.ollama_client.executor.map(
+            lambda recipe_data: self.extract_ingredient_names_only(self.clean_ingredients(recipe_data.get('ingredients', []))),
+            batch))
         
-        self.processed_recipes = []
+        # One batched encode for the batch; get_embedding per recipe would wait out the EmbeddingBatcher window each time
+        embeddable = [i for i, names in enumerate(clean_names)
+                      if names and self.clean_ingredients(batch[i].get('ingredients', []))]
+        encoded = self.recipe_embedding.get_embeddings_batch([clean_names[i] for i in embeddable]) if embeddable else []
+        embeddings = dict(zip(embeddable, encoded))
         
-        for recipe_data in scraped_data:
-            processed = self.process_single_recipe(recipe_data)
+        # URL-less recipes are numbered by input line, so a resumed run assigns the same ids
+        skipped_urls = []
+        for i, (recipe_data, clean_ingredient_names) in enumerate(zip(batch, clean_names)):
+            processed = self.process_single_recipe(recipe_data, clean_ingredient_names, first_line + i,
+                                                   embeddings.get(i))
             if processed:
                 self.processed_recipes.append(processed)
+                if recipe_data.get('crawl_status') == 'changed':
+                    self.changed_recipe_ids.add(processed['recipe_id'])
+            elif recipe_data.get('url'):
+                skipped_urls.append(recipe_data['url'])
+        # Skipped recipes are finished with until their page changes; only storage failures stay pending
+        self.acknowledge(skipped_urls)
+    
+    def acknowledge(self, urls):
+        if self.crawl_state is not None and urls:
+            self.crawl_state.acknowledge(urls)
+    
+    def iter_scraped_batches(self, json_file_path: str, start: int = 0, batch_size: int = 256):
+        """Yield (first line, batch) over the scraped file from line `start`, reading one batch at a time"""
+        scraped_data = self.load_scraped_data(json_file_path, start)
+        line = start
+        while True:
+            batch = list(islice(scraped_data, batch_size))
+            if not batch:
+                return
+            yield line, batch
+            line += len(batch)
+    
+    def process_all_recipes(self, json_file_path: str, start: int = 0):
+        self.processed_recipes = []
+        self.changed_recipe_ids = set()
+        
+        total = 0
+        for first_line, batch in self.iter_scraped_batches(json_file_path, start):
+            self.process_batch(batch, first_line)
+            total += len(batch)
         
-        print(f"Successfully processed {len(self.processed_recipes)} recipes out of {len(scraped_data)} total")
+        print(f"Successfully processed {len(self.processed_recipes)} recipes out of {total} total")
+        if self.ollama_client.cache is not None:
+            print(f"Extraction cache: {self.ollama_client.cache.stats()}")
         return self.processed_recipes
     
-    def save_processed_data(self, output_file_path: str):
-        with open(output_file_path, 'w', encoding='utf-8') as f:
-            json.dump(self.processed_recipes, f, indent=2, ensure_ascii=False)
+    def process_in_batches(self, json_file_path: str, output_file_path: str, start: int = 0, batch_size: int = 256,
+                           store: bool = True):
+        """Constant-memory run: each batch is processed, validated, appended to the output and stored before the next is read
+
+        Starting past line 0 appends to the output, so an interrupted run resumes
+        from the last line offset it printed.
+        """
+        totals = {"read": 0, "processed": 0, "stored": 0, "failed": 0}
+        with JsonlWriter(output_file_path, append=start > 0) as writer:
+            for first_line, batch in self.iter_scraped_batches(json_file_path, start, batch_size):
+                self.processed_recipes = []
+                self.changed_recipe_ids = set()
+                self.process_batch(batch, first_line)
+                totals["read"] += len(batch)
+                totals["processed"] += len(self.processed_recipes)
+                
+                if self.validate_processed_data():
+                    writer.write_many(self.processed_recipes)
+                    writer.flush()
+                    if store and self.processed_recipes:
+                        stored_count, failed_count = self.store_recipes_in_couchbase() or (0, len(self.processed_recipes))
+                        totals["stored"] += stored_count
+                        totals["failed"] += failed_count
+                else:
+                    print(f"Batch from line {first_line} failed validation, not saving or storing it")
+                    totals["failed"] += len(self.processed_recipes)
+                    # Recrawling an unchanged page would reproduce the same batch, so do not keep it pending
+                    self.acknowledge([recipe['source_url'] for recipe in self.processed_recipes
+                                      if recipe.get('source_url')])
+                print(f"Done through line {first_line + len(batch)}; resume with --start {first_line + len(batch)}")
+        
+        self.processed_recipes = []
+        print(f"Processed {totals['processed']} recipes out of {totals['read']} read, saved to {output_file_path}")
+        if self.ollama_client.cache is not None:
+            print(f"Extraction cache: {self.ollama_client.cache.stats()}")
+        return totals
+    
+    def save_processed_data(self, output_file_path: str, append: bool = False):
+        write_jsonl(output_file_path, self.processed_recipes, append=append)
         print(f"Processed recipes saved to {output_file_path}")
     
     def get_couchbase_documents(self):
@@ -197,7 +277,7 @@ class RecipeProcessing:
                 recipe.get('recipe_name') and 
                 recipe.get('ingredients') and 
                 recipe.get('embedding') and
-                len(recipe.get('embedding', [])) == self.recipe_embedding.embedding_dim):
+                len(decode_embedding(recipe)) == self.recipe_embedding.embedding_dim):
                 valid_count += 1
             else:
                 print(f"Invalid recipe: {recipe.get('recipe_name', 'Unknown')}")
@@ -214,39 +294,84 @@ class RecipeProcessing:
             print(f"Failed to connect to Couchbase: {e}")
             return False
     
+    def adopt_existing_keys(self):
+        """Give crawled recipes the key they are already stored under
+
+        Recipes scraped before ids came from the URL are keyed recipe_<n>. They
+        are found by source_url or, failing that, by name, and replaced instead
+        of inserted a second time.
+        """
+        crawled = [recipe for recipe in self.processed_recipes if recipe.get('source_url')]
+        if not crawled:
+            return 0
+        by_url, by_name = self.data_manager.find_recipe_keys({recipe['source_url'] for recipe in crawled},
+                                                             {recipe['recipe_name'] for recipe in crawled})
+        adopted = 0
+        for recipe in crawled:
+            key = by_url.get(recipe['source_url']) or by_name.pop(recipe['recipe_name'], None)
+            if key and key != recipe['recipe_id']:
+                recipe['recipe_id'] = key
+                self.changed_recipe_ids.add(key)
+                adopted += 1
+        return adopted
+    
     def store_recipes_in_couchbase(self):
         if not self.data_manager:
             if not self.init_couchbase_connection():
                 return False
         
-        stored_count = 0
-        failed_count = 0
+        adopted = self.adopt_existing_keys()
+        if adopted:
+            print(f"{adopted} recipes replace documents stored under an earlier key")
         
-        for recipe in self.processed_recipes:
-            try:
-                recipe_id = recipe['recipe_id']
-                result = self.data_manager.insert(recipe_id, recipe)
-                if result:
-                    stored_count += 1
-                    print(f"Stored recipe: {recipe['recipe_name']}")
-                else:
-                    print(f"Recipe already exists: {recipe['recipe_name']}")
-            except Exception as e:
-                failed_count += 1
-                print(f"Failed to store recipe {recipe['recipe_name']}: {e}")
+        result = self.data_manager.insert_many(
+            (recipe['recipe_id'], recipe) for recipe in self.processed_recipes
+            if recipe['recipe_id'] not in self.changed_recipe_ids
+        )
+        updated = self.data_manager.upsert_many(
+            (recipe['recipe_id'], recipe) for recipe in self.processed_recipes
+            if recipe['recipe_id'] in self.changed_recipe_ids
+        )
+        stored_count = result['inserted']
+        failed_count = result['failed'] + updated['failed']
+        
+        if result['exists']:
+            print(f"{result['exists']} recipes already exist")
+        failures = {**result['failures'], **updated['failures']}
+        for key, error in failures.items():
+            print(f"Failed to store recipe {key}: {error}")
+        self.acknowledge([recipe['source_url'] for recipe in self.processed_recipes
+                          if recipe.get('source_url') and recipe['recipe_id'] not in failures])
         
-        print(f"Storage complete: {stored_count} new recipes stored, {failed_count} failed")
+        print(f"Storage complete: {stored_count} new recipes stored, {updated['upserted']} changed recipes updated, "
+              f"{failed_count} failed")
         return stored_count, failed_count
 
 def main():
-    processor = RecipeProcessing()
+    parser = argparse.ArgumentParser(description="Clean, embed and store scraped recipes")
+    parser.add_argument('--input', default='./dataset/pinch_of_yum_recipes.jsonl')
+    parser.add_argument('--output', default='./dataset/processed_pinch_of_yum_recipes.jsonl',
+                        help="JSONL file for the processed recipes; .gz or .zst to compress")
+    parser.add_argument('--start', type=int, default=0, help="input line to resume from; the output is appended to")
+    parser.add_argument('--batch-size', type=int,
+                        help="process, save and store this many recipes at a time with constant memory")
+    parser.add_argument('--state', help="crawl state to acknowledge stored recipes in; "
+                                        "defaults to CRAWL_STATE_PATH or ./dataset/crawl_state.sqlite")
+    args = parser.parse_args()
+    
+    state_path = default_path(args.state)
+    processor = RecipeProcessing(crawl_state=CrawlState(state_path) if os.path.exists(state_path) else None)
+    
+    if args.batch_size:
+        processor.process_in_batches(args.input, args.output, start=args.start, batch_size=args.batch_size)
+        return
     
-    recipes = processor.process_all_recipes('./dataset/pinch_of_yum_recipes.json')
+    recipes = processor.process_all_recipes(args.input, start=args.start)
     
     if processor.validate_processed_data():
         print("\nAll recipes are valid, proceeding with storage...")
         
-        processor.save_processed_data('./dataset/processed_pinch_of_yum_recipes.json')
+        processor.save_processed_data(args.output, append=args.start > 0)
         
         stored_count, failed_count = processor.store_recipes_in_couchbase()
         
@@ -256,7 +381,7 @@ def main():
             print(f"ID: {sample['recipe_id']}")
             print(f"Name: {sample['recipe_name']}")
             print(f"Ingredients: {len(sample['ingredients'])} items")
-            print(f"Embedding dim: {len(sample['embedding'])}")
+            print(f"Embedding dim: {len(decode_embedding(sample))} ({sample['embedding_codec']})")
             print(f"Category: {sample['recipe_category']}")
             print(f"Calories: {sample['calories']}")
             print(f"Total time: {sample['total_time']}")
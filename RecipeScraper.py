@@ -1,27 +1,147 @@
+import argparse
+import asyncio
 import requests
 from bs4 import BeautifulSoup
 import json
 import time
 import re
 from urllib.parse import urljoin
+from CrawlState import CrawlState
+from FilterIndex import parse_duration_minutes
+from JsonLines import write_jsonl
+
+try:
+    import lxml
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+RECIPE_FIELDS = ('title', 'ingredients', 'calories_per_serving', 'image_url', 'prep_time', 'cook_time', 'category')
+
+JSON_LD_PATTERN = re.compile(r'<script[^>]*type=["\']?application/ld\+json["\']?[^>]*>(.*?)</script>', re.S | re.I)
+
+METADATA_PATTERNS = [
+    'author:', 'total time:', 'prep time:', 'cook time:', 'yield:', 'serves:', 'servings:',
+    'calories:', 'difficulty:', 'course:', 'cuisine:', 'keyword:', 'recipe', 'print',
+    'save', 'rate this recipe', 'pin recipe', 'share', 'notes:', 'instructions:',
+    'method:', 'equipment:', 'storage:', 'tips:', 'nutrition:'
+]
+
+def is_valid_ingredient(text):
+    """Check if text looks like an actual ingredient"""
+    if not text or len(text.strip()) < 3:
+        return False
+    
+    # Filter out common metadata patterns
+    text_lower = text.lower().strip()
+    if any(pattern in text_lower for pattern in METADATA_PATTERNS):
+        return False
+        
+    # Filter out very short or very long text
+    if len(text) > 200 or len(text) < 3:
+        return False
+        
+    return True
+
+def find_recipe_node(data):
+    """The schema.org Recipe object in parsed JSON-LD, looking through lists and @graph"""
+    if isinstance(data, list):
+        for item in data:
+            node = find_recipe_node(item)
+            if node:
+                return node
+    elif isinstance(data, dict):
+        types = data.get('@type')
+        if types == 'Recipe' or (isinstance(types, list) and 'Recipe' in types):
+            return data
+        if '@graph' in data:
+            return find_recipe_node(data['@graph'])
+    return None
+
+def _first(value):
+    return value[0] if isinstance(value, list) and value else value
+
+def _duration_text(value):
+    minutes = parse_duration_minutes(value)
+    return f"{minutes:g} minutes" if minutes else None
+
+def recipe_from_json_ld(html):
+    """Recipe fields from the page's JSON-LD without building a parse tree; None when there is no Recipe"""
+    if isinstance(html, bytes):
+        html = html.decode('utf-8', 'replace')
+    for match in JSON_LD_PATTERN.finditer(html):
+        try:
+            node = find_recipe_node(json.loads(match.group(1)))
+        except ValueError:
+            continue
+        if not node:
+            continue
+        
+        nutrition = node.get('nutrition') if isinstance(node.get('nutrition'), dict) else {}
+        calories = re.search(r'\d+', str(nutrition.get('calories') or ''))
+        image = _first(node.get('image'))
+        if isinstance(image, dict):
+            image = image.get('url')
+        category = _first(node.get('recipeCategory'))
+        
+        return {
+            'title': node.get('name'),
+            'ingredients': [ing for ing in node.get('recipeIngredient') or []
+                            if isinstance(ing, str) and is_valid_ingredient(ing)],
+            'calories_per_serving': calories.group() if calories else None,
+            'image_url': image if isinstance(image, str) else None,
+            'prep_time': _duration_text(node.get('prepTime')),
+            'cook_time': _duration_text(node.get('cookTime')),
+            'category': category if isinstance(category, str) else None,
+        }
+    return None
 
 class RecipeScraper:
-    def __init__(self):
-        """Initialize scraper with base URL and session headers"""
+    def __init__(self, base_url="https://pinchofyum.com", crawl_state=None, parser=HTML_PARSER):
+        """Initialize scraper with base URL and session headers; a CrawlState makes runs incremental"""
 
-        self.base_url = "https://pinchofyum.com"
+        self.base_url = base_url.rstrip('/')
+        self.crawl_state = crawl_state
+        self.parser = parser
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
     
-    def get_recipe_links(self):
-        """Extract recipe links from the main recipes page"""
+    @property
+    def listing_url(self):
+        return f"{self.base_url}/recipes/all"
+    
+    def get_recipe_links(self, max_pages=1):
+        """Extract recipe links from the recipes listing, following its pagination for up to max_pages pages"""
+
+        recipe_links = []
+        page_url = self.listing_url
+        visited = set()
+        while page_url and page_url not in visited and (max_pages is None or len(visited) < max_pages):
+            visited.add(page_url)
+            response = self.session.get(page_url)
+            soup = BeautifulSoup(response.content, self.parser)
+            for recipe_url in self.extract_recipe_links(soup):
+                if recipe_url not in recipe_links:
+                    recipe_links.append(recipe_url)
+            page_url = self.next_page_url(soup, page_url)
+        return recipe_links
+    
+    def next_page_url(self, soup, page_url):
+        """Next listing page from a rel="next" or "next" pagination link; None on the last page"""
+
+        link = (soup.find('link', rel='next', href=True) or soup.find('a', rel='next', href=True) or
+                soup.find('a', class_=lambda x: x and 'next' in x.lower(), href=True))
+        if link:
+            next_url = urljoin(page_url, link['href'])
+            if next_url != page_url:
+                return next_url
+        return None
+    
+    def extract_recipe_links(self, soup):
+        """Extract recipe links from one listing page"""
 
-        page_url = f"{self.base_url}/recipes/all"
-        response = self.session.get(page_url)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
         recipe_links = []
         recipe_elements = (
             soup.find_all('article') +
@@ -55,7 +175,7 @@ class RecipeScraper:
                         if recipe_url not in recipe_links and len(href.split('/')) >= 2:
                             recipe_links.append(recipe_url)
         
-        return recipe_links[:20]
+        return recipe_links
     
     def extract_title(self, soup):
         """Extract recipe title from soup object"""
@@ -66,29 +186,6 @@ class RecipeScraper:
     def extract_ingredients(self, soup):
         """Extract ingredients list from recipe page"""
 
-        def is_valid_ingredient(text):
-            """Check if text looks like an actual ingredient"""
-            if not text or len(text.strip()) < 3:
-                return False
-            
-            # Filter out common metadata patterns
-            metadata_patterns = [
-                'author:', 'total time:', 'prep time:', 'cook time:', 'yield:', 'serves:', 'servings:',
-                'calories:', 'difficulty:', 'course:', 'cuisine:', 'keyword:', 'recipe', 'print',
-                'save', 'rate this recipe', 'pin recipe', 'share', 'notes:', 'instructions:',
-                'method:', 'equipment:', 'storage:', 'tips:', 'nutrition:'
-            ]
-            
-            text_lower = text.lower().strip()
-            if any(pattern in text_lower for pattern in metadata_patterns):
-                return False
-                
-            # Filter out very short or very long text
-            if len(text) > 200 or len(text) < 3:
-                return False
-                
-            return True
-
         ingredients = []
         
         # Method 1: Try the existing Tasty Recipes structure
@@ -109,45 +206,40 @@ class RecipeScraper:
                 if is_valid_ingredient(ingredient_text):
                     ingredients.append(ingredient_text)
         
-        # Method 2: Fallback to generic tasty-recipes ingredients
-        if not ingredients:
-            ingredient_lists = soup.find_all('ul', class_=lambda x: x and 'tasty-recipes-ingredients' in x)
-            for ul in ingredient_lists:
-                for li in ul.find_all('li'):
-                    ingredient_text = li.get_text(strip=True)
-                    if is_valid_ingredient(ingredient_text):
-                        ingredients.append(ingredient_text)
-        
-        # Method 3: Look for any list with "ingredient" in class name
+        # Methods 2 and 3 share one walk over the page's classed lists instead of a full-tree search each
         if not ingredients:
-            ingredient_containers = soup.find_all(['ul', 'ol'], class_=lambda x: x and 'ingredient' in x.lower())
-            for container in ingredient_containers:
-                for li in container.find_all('li'):
-                    ingredient_text = li.get_text(strip=True)
-                    if is_valid_ingredient(ingredient_text):
-                        ingredients.append(ingredient_text)
+            tasty_lists = []
+            ingredient_lists = []
+            for container in soup.find_all(['ul', 'ol'], class_=True):
+                classes = ' '.join(container.get('class', []))
+                if container.name == 'ul' and 'tasty-recipes-ingredients' in classes:
+                    tasty_lists.append(container)
+                if 'ingredient' in classes.lower():
+                    ingredient_lists.append(container)
+            
+            # Method 2: Fallback to generic tasty-recipes ingredients, then
+            # Method 3: Look for any list with "ingredient" in class name
+            for lists in (tasty_lists, ingredient_lists):
+                for container in lists:
+                    for li in container.find_all('li'):
+                        ingredient_text = li.get_text(strip=True)
+                        if is_valid_ingredient(ingredient_text):
+                            ingredients.append(ingredient_text)
+                if ingredients:
+                    break
         
         # Method 4: Look for structured data (JSON-LD)
         if not ingredients:
-            json_scripts = soup.find_all('script', type='application/ld+json')
-            for script in json_scripts:
+            for script in soup.find_all('script', type='application/ld+json'):
                 try:
-                    import json as json_module
-                    data = json_module.loads(script.string)
-                    if isinstance(data, list):
-                        for item in data:
-                            if isinstance(item, dict) and item.get('@type') == 'Recipe':
-                                recipe_ingredients = item.get('recipeIngredient', [])
-                                for ing in recipe_ingredients:
-                                    if is_valid_ingredient(ing):
-                                        ingredients.append(ing)
-                    elif isinstance(data, dict) and data.get('@type') == 'Recipe':
-                        recipe_ingredients = data.get('recipeIngredient', [])
-                        for ing in recipe_ingredients:
-                            if is_valid_ingredient(ing):
-                                ingredients.append(ing)
-                except:
+                    recipe_node = find_recipe_node(json.loads(script.string))
+                except (TypeError, ValueError):
                     continue
+                if recipe_node:
+                    ingredients = [ing for ing in recipe_node.get('recipeIngredient', [])
+                                   if isinstance(ing, str) and is_valid_ingredient(ing)]
+                    if ingredients:
+                        break
         
         # Method 5: Generic list search near recipe content (last resort)
         if not ingredients:
@@ -234,23 +326,55 @@ class RecipeScraper:
         }
     
     def scrape_recipe(self, recipe_url):
-        """Scrape all data from a single recipe URL"""
-        response = self.session.get(recipe_url)
-        soup = BeautifulSoup(response.content, 'html.parser')
+        """Scrape all data from a single recipe URL; None when it is unavailable or the crawl state says it has not changed"""
+        headers = self.crawl_state.conditional_headers(recipe_url) if self.crawl_state else {}
+        response = self.session.get(recipe_url, headers=headers)
+        if response.status_code == 304 and self.crawl_state:
+            self.crawl_state.not_modified(recipe_url)
+            return None
+        if response.status_code != 200:
+            print(f"Failed to fetch {recipe_url}: HTTP {response.status_code}")
+            return None
+        recipe_data = self.parse_recipe(response.content)
+        recipe_data['url'] = recipe_url
+        return self.track_changes(recipe_url, recipe_data, response.headers)
+    
+    def track_changes(self, recipe_url, recipe_data, headers):
+        """Tag recipe_data with crawl_status "new" or "changed", or return None if it matches the last crawl"""
+        if self.crawl_state is None:
+            return recipe_data
+        status = self.crawl_state.record(recipe_url, recipe_data, headers)
+        if status is None:
+            return None
+        recipe_data['crawl_status'] = status
+        return recipe_data
+    
+    def parse_recipe(self, html, fast=True):
+        """Extract all recipe fields from the HTML of a recipe page
         
-        metadata = self.extract_metadata(soup)
+        The fast path reads the page's JSON-LD Recipe without building a tree;
+        the BeautifulSoup extractors only run for fields it does not provide.
+        """
+        recipe_data = (recipe_from_json_ld(html) if fast else None) or {}
+        if all(recipe_data.get(field) for field in RECIPE_FIELDS):
+            return recipe_data
         
-        recipe_data = {
-            'title': self.extract_title(soup),
-            'ingredients': self.extract_ingredients(soup),
-            'calories_per_serving': self.extract_calories(soup),
-            'image_url': self.extract_image_url(soup),
-            'prep_time': metadata['prep_time'],
-            'cook_time': metadata['cook_time'],
-            'category': metadata['category']
+        soup = BeautifulSoup(html, self.parser)
+        extractors = {
+            'title': self.extract_title,
+            'ingredients': self.extract_ingredients,
+            'calories_per_serving': self.extract_calories,
+            'image_url': self.extract_image_url,
         }
+        for field, extract in extractors.items():
+            if not recipe_data.get(field):
+                recipe_data[field] = extract(soup)
+        if not all(recipe_data.get(field) for field in ('prep_time', 'cook_time', 'category')):
+            metadata = self.extract_metadata(soup)
+            for field in ('prep_time', 'cook_time', 'category'):
+                recipe_data[field] = recipe_data.get(field) or metadata[field]
         
-        return recipe_data
+        return {field: recipe_data.get(field) for field in RECIPE_FIELDS}
     
     def scrape_multiple_recipes(self, num_recipes=2):
         """Scrape multiple recipes with rate limiting"""
@@ -265,20 +389,81 @@ class RecipeScraper:
             if recipe_data:
                 recipes.append(recipe_data)
                 print(f"Successfully scraped: {recipe_data['title']}")
+            else:
+                print(f"Skipped (unchanged since the last crawl or unavailable): {link}")
             
             time.sleep(1)
         
         return recipes
     
-    def save_recipes_to_json(self, recipes, filename="./dataset/pinch_of_yum_recipes.json"):
-        """Save scraped recipes to JSON file"""
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(recipes, f, indent=2, ensure_ascii=False)
-        print(f"Recipes saved to {filename}")
+    def crawl_recipes(self, num_recipes=None, max_pages=None, **options):
+        """Concurrent, rate-limited crawl of the whole listing; options go to AsyncCrawler"""
+        from AsyncCrawler import AsyncCrawler
+        crawler = AsyncCrawler(self, **options)
+        recipes = asyncio.run(crawler.crawl(max_pages=max_pages, limit=num_recipes))
+        print(f"Crawl stats: {crawler.stats}")
+        return recipes
+    
+    def crawl_to_jsonl(self, filename="./dataset/pinch_of_yum_recipes.jsonl", num_recipes=None, max_pages=None,
+                       append=False, **options):
+        """crawl_recipes that writes each recipe to a JSONL file as it arrives instead of keeping them in memory"""
+        from AsyncCrawler import AsyncCrawler
+        crawler = AsyncCrawler(self, **options)
+        count = asyncio.run(crawler.crawl_to_jsonl(filename, append=append, max_pages=max_pages, limit=num_recipes))
+        print(f"Crawl stats: {crawler.stats}")
+        print(f"{count} recipes saved to {filename}")
+        return count
+    
+    def save_recipes_to_json(self, recipes, filename="./dataset/pinch_of_yum_recipes.jsonl", append=False):
+        """Save scraped recipes as JSON lines, gzip/zstd compressed for a .gz/.zst filename"""
+        count = write_jsonl(filename, recipes, append=append)
+        print(f"{count} recipes saved to {filename}")
+
+_page_parsers = {}
+
+def parse_recipe_html(html, url=None, base_url="https://pinchofyum.com", parser=HTML_PARSER, fast=True):
+    """RecipeScraper.parse_recipe as a module-level function that process pools can run
+
+    Each process keeps one RecipeScraper per configuration, so the pool only
+    ships the page in and the extracted fields back.
+    """
+    scraper = _page_parsers.get((base_url, parser))
+    if scraper is None:
+        scraper = _page_parsers[(base_url, parser)] = RecipeScraper(base_url=base_url, parser=parser)
+    recipe_data = scraper.parse_recipe(html, fast=fast)
+    if url:
+        recipe_data['url'] = url
+    return recipe_data
 
 def main():
-    scraper = RecipeScraper()
-    recipes = scraper.scrape_multiple_recipes(num_recipes=2)
+    parser = argparse.ArgumentParser(description="Scrape recipes from Pinch of Yum")
+    parser.add_argument('--num-recipes', type=int, default=2)
+    parser.add_argument('--crawl', action='store_true', help="crawl concurrently with rate limiting instead of one page at a time")
+    parser.add_argument('--max-pages', type=int, help="listing pages to follow when crawling; all by default")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--rate', type=float, default=4.0, help="requests per second per host when crawling")
+    parser.add_argument('--state', help="crawl state database; defaults to CRAWL_STATE_PATH or ./dataset/crawl_state.sqlite")
+    parser.add_argument('--full', action='store_true', help="ignore the crawl state and emit every recipe")
+    parser.add_argument('--save-html', help="directory to keep the raw HTML of crawled recipe pages")
+    parser.add_argument('--parse-workers', type=int, default=0, help="processes that parse pages while the crawl fetches")
+    parser.add_argument('--output', default="./dataset/pinch_of_yum_recipes.jsonl",
+                        help="JSONL file for the recipes; .gz or .zst to compress")
+    parser.add_argument('--append', action='store_true', help="add to the output file instead of replacing it")
+    args = parser.parse_args()
+
+    crawl_state = None if args.full else CrawlState(args.state)
+    scraper = RecipeScraper(crawl_state=crawl_state)
+    if args.crawl:
+        # Recipes are written as they arrive, so memory stays flat however large the crawl
+        count = scraper.crawl_to_jsonl(args.output, num_recipes=args.num_recipes, max_pages=args.max_pages,
+                                       append=args.append, max_concurrency=args.concurrency, rate=args.rate,
+                                       save_html=args.save_html, parse_workers=args.parse_workers)
+        if not count:
+            print("No new or changed recipes since the last crawl" if crawl_state else "No recipes were scraped successfully")
+        if crawl_state:
+            print(f"Crawl state: {crawl_state.stats()}")
+        return
+    recipes = scraper.scrape_multiple_recipes(num_recipes=args.num_recipes)
     
     if recipes:
         print(f"\nSuccessfully scraped {len(recipes)} recipes:")
@@ -292,9 +477,13 @@ def main():
             print(f"  Image: {recipe.get('image_url', 'N/A')}")
             print()
         
-        scraper.save_recipes_to_json(recipes)
+        scraper.save_recipes_to_json(recipes, args.output, append=args.append)
+    elif crawl_state:
+        print("No new or changed recipes since the last crawl")
     else:
         print("No recipes were scraped successfully")
+    if crawl_state:
+        print(f"Crawl state: {crawl_state.stats()}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
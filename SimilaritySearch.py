@@ -1,17 +1,21 @@
 from RecipeEmbedding import RecipeEmbedding
 from DataManager import DataManager
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from RecipeIndex import SharedRecipeIndex
+from EmbeddingCodec import EMBEDDING_FIELDS
 import os
 from dotenv import load_dotenv
 
 class SimilaritySearch:
 
-    def __init__(self, user_ingredients):
+    def __init__(self, user_ingredients=None, recipe_index=None, search_mode=None, vector_backend=None):
+        load_dotenv()
         self.user_ingredients = user_ingredients
         self.user_embedding = None
         self.recipe_embedding = RecipeEmbedding(model_name='all-MiniLM-L6-v2')
-        self.data_manager = DataManager()
+        self.recipe_index = recipe_index
+        # "client" scores against the in-process index, "server" asks the Couchbase Search vector index
+        self.search_mode = search_mode or os.getenv("SEARCH_MODE", "client")
+        self.vector_backend = vector_backend
 
     def get_user_embedding(self):
         try:
@@ -22,51 +26,88 @@ class SimilaritySearch:
             print(f"Failed to vectorize ingredients: {str(e)}")
             return None
             
-    def get_doc_from_db(self):
+    def get_recipe_index(self):
         try:
-            return self.data_manager.read_all()
+            if self.recipe_index is None:
+                self.recipe_index = SharedRecipeIndex.get(DataManager)
+            else:
+                # Long-lived engines hold on to the index, so pull the created_at delta once it is due
+                self.recipe_index.ensure_fresh()
+            return self.recipe_index
         except Exception as e:
-            print(f"Error retrieving documents: {str(e)}")
+            print(f"Error loading recipe index: {str(e)}")
     
-    def find_similar_recipes(self, top_k=3, threshold=0.1):
+    def find_similar_recipes_server(self, top_k=3, threshold=0.1, filters=None):
+        if self.vector_backend is None:
+            self.vector_backend = DataManager()
+        hits = self.vector_backend.vector_search(self.user_embedding, k=top_k, filters=filters)
+        return [
+            {
+                'recipe': {field: value for field, value in recipe.items() if field not in EMBEDDING_FIELDS},
+                'similarity_score': float(similarity)
+            }
+            for _, recipe, similarity in hits if similarity >= threshold
+        ]
+    
+    def find_similar_recipes(self, top_k=3, threshold=0.1, filters=None, required_ingredients=None,
+                             excluded_ingredients=None, lexical_weight=0.0, raise_errors=False):
+        """`filters` maps recipe_category to a value and calories, aggregated_rating or
+        total_time_minutes to an inclusive (min, max) pair; None leaves a side open.
+        A lexical_weight above 0 blends BM25 ingredient overlap into the ranking.
+        With raise_errors the exception reaches the caller instead of an empty result."""
         try:
             
-            all_recipes = self.get_doc_from_db()
+            # The Search index has no ingredient postings, so those queries stay client-side
+            lexical = required_ingredients or excluded_ingredients or lexical_weight
+            if self.search_mode == "server" and not lexical:
+                return self.find_similar_recipes_server(top_k=top_k, threshold=threshold, filters=filters)
+            
+            recipe_index = self.get_recipe_index()
             
-            if not all_recipes:
-                print(self.user_embedding)
+            if not recipe_index or not len(recipe_index.index):
                 print("No recipes found in the database")
                 return []
             
-            user_embedding_np = np.array(self.user_embedding).reshape(1, -1)
-            
-            similar_recipes = []
-            for recipe in all_recipes:
-                if 'embedding' not in recipe:
-                    continue
-                
-                recipe_embedding = recipe['embedding']
-                
-                try:
-                    recipe_embedding_np = np.array(recipe_embedding).reshape(1, -1)
-                    
-                    similarity = float(cosine_similarity(user_embedding_np, recipe_embedding_np)[0][0])
-                    
-                    if similarity >= threshold:
-                        similar_recipes.append({
-                            'recipe': recipe,
-                            'similarity_score': similarity
-                        })
-                except Exception as e:
-                    print(f"Error calculating similarity for recipe: {e}")
-                    continue
-            
-            similar_recipes.sort(key=lambda x: x['similarity_score'], reverse=True)
-            
-            return similar_recipes[:top_k]
+            # In hybrid mode `score` is the blended ranking score; similarity_score stays the cosine
+            return [
+                {
+                    'recipe': recipe,
+                    'similarity_score': similarity,
+                    **({'score': ranking[0]} if ranking else {})
+                }
+                for recipe, similarity, *ranking in recipe_index.search(
+                    self.user_embedding, top_k=top_k, threshold=threshold, filters=filters,
+                    required=required_ingredients, excluded=excluded_ingredients,
+                    query_ingredients=self.user_ingredients, lexical_weight=lexical_weight)
+            ]
             
         except Exception as e:
+            if raise_errors:
+                raise
             print(f"Error finding similar recipes: {str(e)}")
             import traceback
             traceback.print_exc()
             return []
+    
+    def find_similar_recipes_batch(self, queries, top_k=3, threshold=0.1, filters=None, batch_size=256,
+                                   raise_errors=False):
+        """Top-k for many ingredient lists: one batched encode and chunked matrix-matrix scoring"""
+        try:
+            recipe_index = self.get_recipe_index()
+            if not recipe_index or not len(recipe_index.index):
+                print("No recipes found in the database")
+                return [[] for _ in queries]
+            
+            query_embeddings = self.recipe_embedding.get_embeddings_batch(queries, batch_size=batch_size)
+            return [
+                [{'recipe': recipe, 'similarity_score': similarity} for recipe, similarity in results]
+                for results in recipe_index.search_batch(query_embeddings, top_k=top_k, threshold=threshold,
+                                                         filters=filters)
+            ]
+        except Exception as e:
+            if raise_errors:
+                raise
+            print(f"Error finding similar recipes: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return [[] for _ in queries]
@@ -3,8 +3,24 @@ import re
 os.environ["STREAMLIT_WATCHER_TYPE"] = "none"
 os.environ["STREAMLIT_SERVER_RUN_ON_SAVE"] = "false"
 from SimilaritySearch import SimilaritySearch
+from ModelRegistry import ModelRegistry
+import requests
 import streamlit as st
 
+# When set, searches go to search_service.py instead of running inside the Streamlit process
+SEARCH_SERVICE_URL = os.getenv("SEARCH_SERVICE_URL")
+
+if not SEARCH_SERVICE_URL:
+    # Cheap after the first run: the registry lives for the whole server process
+    ModelRegistry.warm_up()
+
+
+def search_remote(ingredients, **options):
+    response = requests.post(f"{SEARCH_SERVICE_URL.rstrip('/')}/search",
+                             json={'ingredients': ingredients, **options}, timeout=30)
+    response.raise_for_status()
+    return response.json()['results']
+
 
 def extract_first_image_url(images_string):
     """
@@ -36,25 +52,58 @@ with st.form("recipe_search_form"):
     with col2:
         min_similarity = st.slider("Minimum similarity:", min_value=0.0, max_value=1.0, value=0.1, step=0.1)
 
+    with st.expander("Filters"):
+        category = st.text_input("Category:", placeholder="e.g., Dessert")
+        col3, col4, col5 = st.columns(3)
+        with col3:
+            max_calories = st.number_input("Max calories (0 = any):", min_value=0, value=0, step=50)
+        with col4:
+            max_total_time = st.number_input("Max total time in minutes (0 = any):", min_value=0, value=0, step=5)
+        with col5:
+            min_rating = st.slider("Minimum rating:", min_value=0.0, max_value=5.0, value=0.0, step=0.5)
+        required_ingredients = st.text_input("Must contain (comma separated):", placeholder="e.g., tofu")
+        excluded_ingredients = st.text_input("Must not contain (comma separated):", placeholder="e.g., peanuts")
+        lexical_weight = st.slider("Exact ingredient match weight:", min_value=0.0, max_value=1.0, value=0.0, step=0.1)
+
     submitted = st.form_submit_button("🔍 Find Similar Recipes")
 
 if submitted:
+    filters = {}
+    if category.strip():
+        filters['recipe_category'] = category.strip()
+    if max_calories:
+        filters['calories'] = (None, max_calories)
+    if max_total_time:
+        filters['total_time_minutes'] = (None, max_total_time)
+    if min_rating:
+        filters['aggregated_rating'] = (min_rating, None)
+
     if user_ingredients.strip():
         st.info("Searching for similar recipes...")
 
-        similarity_search = SimilaritySearch(user_ingredients)            
+        search_options = dict(
+            top_k=top_k, threshold=min_similarity, filters=filters,
+            required_ingredients=required_ingredients.strip() or None,
+            excluded_ingredients=excluded_ingredients.strip() or None,
+            lexical_weight=lexical_weight)
+
+        similarity_search = None if SEARCH_SERVICE_URL else SimilaritySearch(user_ingredients)
         
-        if similarity_search:
-            try:
-                user_embedding = similarity_search.get_user_embedding()
-                st.success("Successfully processed your ingredients!")
-            except Exception as e:
-                st.error(f"Error processing ingredients: {str(e)}")
-                st.stop()
+        if similarity_search or SEARCH_SERVICE_URL:
+            if similarity_search:
+                try:
+                    user_embedding = similarity_search.get_user_embedding()
+                    st.success("Successfully processed your ingredients!")
+                except Exception as e:
+                    st.error(f"Error processing ingredients: {str(e)}")
+                    st.stop()
             
             try:
                 
-                similar_recipes = similarity_search.find_similar_recipes(top_k=top_k, threshold=min_similarity)
+                if SEARCH_SERVICE_URL:
+                    similar_recipes = search_remote(user_ingredients, **search_options)
+                else:
+                    similar_recipes = similarity_search.find_similar_recipes(**search_options)
                 
                 if similar_recipes and len(similar_recipes) > 0:
                     st.success(f"Found {len(similar_recipes)} potential recipes!")
@@ -69,7 +118,10 @@ if submitted:
                                          recipe.get('name', 
                                          recipe.get('title', f"Recipe {i}")))
                         
-                        with st.expander(f"{i}. {recipe_name} (Similarity: {similarity_score:.3f})"):
+                        label = f"Similarity: {similarity_score:.3f}"
+                        if 'score' in item:
+                            label = f"Score: {item['score']:.3f}, {label}"
+                        with st.expander(f"{i}. {recipe_name} ({label})"):
                             if isinstance(recipe, dict) and 'images' in recipe:
                                 image_url = extract_first_image_url(recipe['images'])
                                 if image_url:
@@ -135,6 +187,6 @@ if submitted:
 
 st.sidebar.markdown("### How to use:")
 st.sidebar.markdown("1. Enter ingredients you have at home")
-st.sidebar.markdown("2. Adjust the number of results and similarity threshold")
+st.sidebar.markdown("2. Adjust the number of results and similarity threshold, and optionally filter by category, calories, time or rating")
 st.sidebar.markdown("3. Click 'Find Similar Recipes' to get recommendations")
 st.sidebar.markdown("4. Explore the recipe details in the expandable sections")
@@ -0,0 +1,65 @@
+import argparse
+import contextlib
+import json
+import sys
+from itertools import islice
+from SimilaritySearch import SimilaritySearch
+
+SUMMARY_FIELDS = ('recipe_id', 'recipe_name', 'recipe_category', 'calories', 'total_time', 'aggregated_rating')
+
+def read_queries(stream):
+    """Yield (query_id, ingredients) from JSONL lines with an "ingredients" string or list and an optional "id" """
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        yield record.get('id', line_number), record['ingredients']
+
+def format_results(results, full):
+    return [
+        {
+            **(dict(item['recipe']) if full else
+               {field: item['recipe'].get(field) for field in SUMMARY_FIELDS}),
+            'similarity_score': item['similarity_score'],
+        }
+        for item in results
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Top-k similar recipes for every ingredient list in a JSONL file")
+    parser.add_argument('input', nargs='?', help="JSONL queries; defaults to stdin")
+    parser.add_argument('-o', '--output', help="JSONL results; defaults to stdout")
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.1)
+    parser.add_argument('--batch-size', type=int, default=1024, help="queries encoded and scored per pass")
+    parser.add_argument('--full', action='store_true', help="write whole recipe documents instead of a summary")
+    args = parser.parse_args()
+
+    source = open(args.input, 'r', encoding='utf-8') if args.input else sys.stdin
+    sink = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    total = 0
+    # Model loading and index messages are printed; keep them out of JSONL written to stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        search = SimilaritySearch()
+        try:
+            queries = read_queries(source)
+            while True:
+                batch = list(islice(queries, args.batch_size))
+                if not batch:
+                    break
+                batch_results = search.find_similar_recipes_batch([ingredients for _, ingredients in batch],
+                                                                  top_k=args.top_k, threshold=args.threshold)
+                for (query_id, ingredients), results in zip(batch, batch_results):
+                    sink.write(json.dumps({'id': query_id, 'ingredients': ingredients,
+                                           'results': format_results(results, args.full)}, ensure_ascii=False) + '\n')
+                total += len(batch)
+                print(f"Processed {total} queries", file=sys.stderr)
+        finally:
+            if args.input:
+                source.close()
+            if args.output:
+                sink.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import time
+import numpy as np
+from RecipeIndex import RecipeIndex
+
+def load_embeddings(path):
+    """Recipe embeddings from an (n, dim) .npy file, or straight from Couchbase when no path is given"""
+    if path:
+        return np.load(path, mmap_mode='r').astype(np.float32)
+    from DataManager import DataManager
+    index = RecipeIndex.from_documents(DataManager().read_embeddings(), id_field='id')
+    print(f"Loaded {len(index)} embeddings from Couchbase")
+    return index.matrix
+
+def recall_at_k(exact, approximate):
+    exact_ids = {position for position, _ in exact}
+    if not exact_ids:
+        return 1.0
+    return len(exact_ids & {position for position, _ in approximate}) / len(exact_ids)
+
+def run(matrix, queries, top_k, threshold, nlist, nprobes):
+    exact_index = RecipeIndex.from_matrix(range(len(matrix)), matrix)
+    ann_index = RecipeIndex.from_matrix(range(len(matrix)), matrix)
+
+    start = time.perf_counter()
+    ann_index.build_ann(nlist=nlist)
+    print(f"Built IVF index with {ann_index.ann.nlist} lists over {len(matrix)} recipes in {time.perf_counter() - start:.2f}s")
+
+    exact_results = []
+    start = time.perf_counter()
+    for query in queries:
+        exact_results.append(exact_index.search(query, top_k=top_k, threshold=threshold))
+    exact_latency = (time.perf_counter() - start) / len(queries)
+
+    print(f"{'search':>12} {'recall@' + str(top_k):>10} {'ms/query':>10}")
+    print(f"{'exact':>12} {1.0:>10.3f} {exact_latency * 1000:>10.3f}")
+    for nprobe in nprobes:
+        recalls = []
+        start = time.perf_counter()
+        for query, exact in zip(queries, exact_results):
+            recalls.append(recall_at_k(exact, ann_index.search(query, top_k=top_k, threshold=threshold, nprobe=nprobe)))
+        latency = (time.perf_counter() - start) / len(queries)
+        print(f"{'nprobe=' + str(nprobe):>12} {np.mean(recalls):>10.3f} {latency * 1000:>10.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k and latency of the IVF index against exact search")
+    parser.add_argument('--embeddings', help=".npy file of recipe embeddings; defaults to reading Couchbase")
+    parser.add_argument('--queries', type=int, default=200, help="held-out recipes used as queries")
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--threshold', type=float, default=0.0)
+    parser.add_argument('--nlist', type=int, default=256)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    embeddings = load_embeddings(args.embeddings)
+    rng = np.random.default_rng(args.seed)
+    order = rng.permutation(len(embeddings))
+    queries = embeddings[order[:args.queries]]
+    matrix = embeddings[order[args.queries:]]
+    run(matrix, queries, args.top_k, args.threshold, args.nlist, args.nprobe)
+
+if __name__ == "__main__":
+    main()
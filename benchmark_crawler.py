@@ -0,0 +1,152 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from AsyncCrawler import AsyncCrawler
+from CrawlState import CrawlState
+from RecipeScraper import RecipeScraper
+
+INGREDIENTS = ["2 cups flour", "1 tsp salt", "3 cloves garlic", "1 onion, diced", "2 tbsp olive oil",
+               "1 lb chicken thighs", "1 cup rice", "2 tomatoes", "1/2 cup parmesan", "1 tbsp butter"]
+
+def recipe_html(number, revision=0):
+    """A recipe page shaped like the Tasty Recipes markup RecipeScraper targets, with JSON-LD"""
+    ingredients = INGREDIENTS[(number + revision) % 5:] + INGREDIENTS[:(number + revision) % 5]
+    items = "".join(f'<li data-tr-ingredient-checkbox=""><span class="tr-ingredient-checkbox-container"></span>{text}</li>'
+                    for text in ingredients)
+    json_ld = json.dumps({"@context": "https://schema.org", "@type": "Recipe", "name": f"Fixture Recipe {number}",
+                          "recipeIngredient": ingredients, "recipeCategory": "Dinner",
+                          "prepTime": "PT10M", "cookTime": "PT20M",
+                          "nutrition": {"@type": "NutritionInformation", "calories": f"{300 + number % 200} calories"},
+                          "image": [f"https://example.com/images/{number}.jpg"]})
+    filler = "".join(f"<p>Story paragraph {i} about recipe {number}.</p>" for i in range(40))
+    return f"""<!DOCTYPE html><html><head><title>Fixture Recipe {number}</title>
+<script type="application/ld+json">{json_ld}</script></head>
+<body><div><div><div><header><div>Dinner</div><div><span>{300 + number % 200} calories</span></div></header></div></div></div>
+<h1 class="entry-title">Fixture Recipe {number}</h1>{filler}
+<div class="tasty-pins-banner-container"><img src="//example.com/images/{number}.jpg"></div>
+<div class="tasty-recipes"><div data-tasty-recipes-customization="body-color.color"><ul>{items}</ul></div>
+<span class="tasty-recipes-prep-time">10 minutes</span><span class="tasty-recipes-cook-time">20 minutes</span>
+<span class="tasty-recipes-category">Dinner</span></div></body></html>"""
+
+def listing_html(page, recipes, page_size):
+    first = (page - 1) * page_size
+    articles = "".join(f'<article><a href="/recipe-{number}">Recipe {number}</a></article>'
+                       for number in range(first, min(first + page_size, recipes)))
+    next_link = f'<a class="next page-numbers" href="/recipes/all/page/{page + 1}">Next</a>' \
+        if first + page_size < recipes else ""
+    return f"<html><body>{articles}{next_link}</body></html>"
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Serves a paginated recipe listing and recipe pages after a fixed delay, failing a fraction with 503
+
+    Recipe pages carry an ETag and answer a matching If-None-Match with 304;
+    bumping a recipe's entry in `revisions` changes its ingredients.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    recipes = 1000
+    page_size = 24
+    latency = 0.05
+    fail_rate = 0.0
+    revisions = {}
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if self.fail_rate and random.random() < self.fail_rate:
+            return self._send(503)
+        listing = re.fullmatch(r'/recipes/all(?:/page/(\d+))?/?', self.path)
+        recipe = re.fullmatch(r'/recipe-(\d+)/?', self.path)
+        if listing:
+            self._send(200, listing_html(int(listing.group(1) or 1), self.recipes, self.page_size).encode())
+        elif recipe and int(recipe.group(1)) < self.recipes:
+            number = int(recipe.group(1))
+            body = recipe_html(number, self.revisions.get(number, 0)).encode()
+            etag = f'"{hashlib.md5(body).hexdigest()}"'
+            if self.headers.get('If-None-Match') == etag:
+                self._send(304, headers={'ETag': etag})
+            else:
+                self._send(200, body, headers={'ETag': etag})
+        else:
+            self._send(404)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_fixture_server(recipes=1000, latency=0.05, fail_rate=0.0, handler=FixtureHandler):
+    handler.recipes = recipes
+    handler.latency = latency
+    handler.fail_rate = fail_rate
+    handler.revisions = {}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Sequential scraping against the async crawler on a local fixture site")
+    parser.add_argument('--recipes', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.05, help="fixture server response time in seconds")
+    parser.add_argument('--fail-rate', type=float, default=0.02, help="fraction of responses that are 503")
+    parser.add_argument('--sequential', type=int, default=50, help="pages timed for the one-at-a-time baseline")
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--rate', type=float, default=100.0, help="requests per second per host")
+    parser.add_argument('--parse-workers', type=int, default=0, help="parse in a process pool of this size")
+    parser.add_argument('--incremental', type=float, default=0.05,
+                        help="fraction of recipes changed before a second crawl with a crawl state")
+    args = parser.parse_args()
+
+    server, base_url = start_fixture_server(args.recipes, args.latency, args.fail_rate)
+    scraper = RecipeScraper(base_url=base_url)
+
+    # The shipped loop sleeps 1s between pages on top of the fetch, so time a sample and extrapolate
+    links = [f"{base_url}/recipe-{number}" for number in range(args.sequential)]
+    start = time.perf_counter()
+    for link in links:
+        scraper.scrape_recipe(link)
+    per_page = (time.perf_counter() - start) / len(links) + 1.0
+    print(f"sequential with sleep(1): {1 / per_page:8.2f} pages/s, ~{per_page * args.recipes:8.1f}s for {args.recipes} pages")
+
+    crawler = AsyncCrawler(scraper, max_concurrency=args.concurrency, per_host=args.concurrency,
+                           rate=args.rate, backoff=0.05, parse_workers=args.parse_workers)
+    start = time.perf_counter()
+    recipes = asyncio.run(crawler.crawl())
+    elapsed = time.perf_counter() - start
+    print(f"{'async crawl':>24}: {len(recipes) / elapsed:8.2f} pages/s, {elapsed:9.1f}s for {len(recipes)} pages")
+    print(f"Crawl stats: {crawler.stats}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        crawl_state = CrawlState(os.path.join(directory, "crawl_state.sqlite"))
+        scraper = RecipeScraper(base_url=base_url, crawl_state=crawl_state)
+        asyncio.run(AsyncCrawler(scraper, max_concurrency=args.concurrency, per_host=args.concurrency,
+                                 rate=args.rate, backoff=0.05).crawl())
+        for number in random.sample(range(args.recipes), int(args.recipes * args.incremental)):
+            FixtureHandler.revisions[number] = 1
+        start = time.perf_counter()
+        recipes = asyncio.run(AsyncCrawler(scraper, max_concurrency=args.concurrency, per_host=args.concurrency,
+                                           rate=args.rate, backoff=0.05).crawl())
+        elapsed = time.perf_counter() - start
+        print(f"{'incremental recrawl':>24}: {elapsed:9.1f}s, {len(recipes)} changed recipes passed on")
+        print(f"Crawl state: {crawl_state.stats()}")
+        crawl_state.close()
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import threading
+import time
+import numpy as np
+from EmbeddingBatcher import EmbeddingBatcher
+from ModelRegistry import ModelRegistry
+
+def run_clients(encode, texts, clients):
+    """Each client thread encodes its share of the texts one at a time, like concurrent search requests"""
+    latencies = [[] for _ in range(clients)]
+
+    def client(worker):
+        for text in texts[worker::clients]:
+            start = time.perf_counter()
+            encode(text)
+            latencies[worker].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(worker,)) for worker in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return len(texts) / elapsed, np.concatenate([np.array(worker, dtype=np.float64) for worker in latencies]) * 1000
+
+def report(label, throughput, latencies):
+    p50, p99 = np.percentile(latencies, [50, 99])
+    print(f"{label:>22} {throughput:>10.1f} {p50:>9.2f} {p99:>9.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Query embedding throughput and latency with and without micro-batching")
+    parser.add_argument('--model', default='all-MiniLM-L6-v2')
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--max-batch-size', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=2)
+    args = parser.parse_args()
+
+    ModelRegistry.warm_up((args.model,))
+    model = ModelRegistry.get(args.model)
+    # Distinct texts so neither path benefits from duplicates
+    texts = [f"chicken, garlic, {i} tomatoes, onion, basil" for i in range(args.queries)]
+
+    print(f"{'':>22} {'queries/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+    for clients in args.clients:
+        report(f"direct x{clients}", *run_clients(model.encode, texts, clients))
+        batcher = EmbeddingBatcher(model, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+        report(f"batched x{clients}", *run_clients(batcher.encode, texts, clients))
+        stats = batcher.stats()
+        print(f"{'':>22} mean batch {stats['mean_batch_size']}, histogram {stats['batch_size_histogram']}")
+
+if __name__ == "__main__":
+    main()
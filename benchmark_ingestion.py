@@ -0,0 +1,60 @@
+import argparse
+import time
+from functools import partial
+from itertools import islice
+import numpy as np
+from EmbeddingCodec import decode_embedding
+from IngestionPipeline import IngestionPipeline, embed_records_in_worker
+
+def load_chunks(csv_path, rows, chunk_size):
+    """Parsed records from the first `rows` of the CSV; Ollama cleaning is skipped so only embedding is timed"""
+    pipeline = IngestionPipeline(csv_path, chunk_size=chunk_size)
+    chunks = [pipeline.parse_chunk(chunk) for chunk in islice(pipeline.read_chunks(), -(-rows // chunk_size))]
+    return [chunk for chunk in chunks if chunk]
+
+def embed_with_workers(csv_path, chunks, workers, torch_threads, batch_size):
+    pipeline = IngestionPipeline(csv_path, embedding_batch_size=batch_size, embedding_workers=workers,
+                                 torch_threads=torch_threads)
+    embed = partial(embed_records_in_worker, batch_size=batch_size)
+    with pipeline.create_embedding_pool() as pool:
+        # Every worker loads its model before the clock starts
+        list(pool.map(embed, [chunks[0][:1]] * workers * 4))
+        start = time.perf_counter()
+        documents = [document for chunk in pool.map(embed, chunks) for document in chunk]
+        elapsed = time.perf_counter() - start
+    return documents, elapsed, pipeline.torch_threads
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding throughput and scaling efficiency of the ingestion worker pool")
+    parser.add_argument('--csv', default='./dataset/recipes.csv')
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    # One thread per worker makes efficiency (speedup / workers) a measure of process scaling alone
+    parser.add_argument('--torch-threads', type=int, default=1, help="torch threads per worker")
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.csv, args.rows, args.chunk_size)
+    total = sum(len(chunk) for chunk in chunks)
+    print(f"Embedding {total} recipes in {len(chunks)} chunks")
+    print(f"{'workers':>8} {'threads':>8} {'recipes/s':>10} {'speedup':>8} {'efficiency':>10} {'max |diff|':>11}")
+
+    baseline = None
+    reference = None
+    for workers in args.workers:
+        documents, elapsed, torch_threads = embed_with_workers(args.csv, chunks, workers, args.torch_threads,
+                                                               args.batch_size)
+        throughput = total / elapsed
+        embeddings = np.stack([decode_embedding(document) for document in documents])
+        if baseline is None:
+            baseline, reference = throughput, embeddings
+        # Same recipes in the same order whatever the worker count; only float rounding may differ
+        assert [document['recipe_id'] for document in documents] == \
+               [record['recipe_id'] for chunk in chunks for record in chunk]
+        speedup = throughput / baseline
+        print(f"{workers:>8} {torch_threads:>8} {throughput:>10.1f} {speedup:>8.2f} {speedup / workers:>10.2f} "
+              f"{np.abs(embeddings - reference).max():>11.2e}")
+
+if __name__ == "__main__":
+    main()
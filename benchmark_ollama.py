@@ -0,0 +1,69 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from OllamaClient import OllamaClient
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    """Answers /api/generate after a fixed delay, like a model generating a short reply"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0.05
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        json.loads(self.rfile.read(length) or b'{}')
+        time.sleep(self.latency)
+        body = json.dumps({"response": "chicken, garlic, onion"}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(latency):
+    StubOllamaHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOllamaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def sequential_baseline(endpoint, texts):
+    """One blocking requests.post per recipe, as clean_single used to do"""
+    for text in texts:
+        requests.post(f"{endpoint}/api/generate", json={"model": "llama3.2:3b", "prompt": text, "stream": False})
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure OllamaClient throughput against a local stub server")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05, help="stub generation time in seconds")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    server = start_stub_server(args.latency)
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+    texts = [f"2 cups flour, {i} eggs, 1 tsp salt" for i in range(args.requests)]
+
+    start = time.perf_counter()
+    sequential_baseline(endpoint, texts)
+    elapsed = time.perf_counter() - start
+    print(f"{'sequential requests.post':>26}: {args.requests / elapsed:8.1f} req/s")
+
+    for concurrency in args.concurrency:
+        client = OllamaClient(endpoint=endpoint, max_concurrency=concurrency)
+        start = time.perf_counter()
+        results = client.extract_many(texts)
+        elapsed = time.perf_counter() - start
+        client.close()
+        assert all(results), "stub returned no ingredients"
+        print(f"{f'OllamaClient x{concurrency}':>26}: {args.requests / elapsed:8.1f} req/s")
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
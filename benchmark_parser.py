@@ -0,0 +1,78 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+from RecipeScraper import HTML_PARSER, RecipeScraper, parse_recipe_html
+
+def load_fixtures(directory):
+    """Raw HTML of every .html file in directory, e.g. pages saved with RecipeScraper.py --crawl --save-html"""
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.html'))):
+        with open(path, 'rb') as f:
+            fixtures.append(f.read())
+    return fixtures
+
+def generate_fixtures(count):
+    from benchmark_crawler import recipe_html
+    return [recipe_html(number).encode() for number in range(count)]
+
+def time_parser(parse, fixtures, repeat):
+    timings = []
+    results = []
+    for html in fixtures:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = parse(html)
+        timings.append((time.perf_counter() - start) / repeat)
+        results.append(result)
+    return np.array(timings) * 1000, results
+
+def pool_throughput(fixtures, workers, fast):
+    """Pages per second when a process pool parses every fixture, as AsyncCrawler does with parse_workers"""
+    parse = partial(parse_recipe_html, fast=fast)
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        list(pool.map(parse, fixtures[:workers * 2]))
+        start = time.perf_counter()
+        for _ in pool.map(parse, fixtures, chunksize=4):
+            pass
+        return len(fixtures) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-page recipe parse time of each RecipeScraper extraction path")
+    parser.add_argument('--fixtures', help="directory of saved recipe pages; generated pages are used when omitted")
+    parser.add_argument('--generate', type=int, default=200, help="pages to generate without --fixtures")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8], help="process pool sizes to time")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else generate_fixtures(args.generate)
+    print(f"Parsing {len(fixtures)} pages, {np.mean([len(html) for html in fixtures]) / 1024:.1f} KiB on average")
+
+    paths = [("html.parser, soup only", RecipeScraper(parser="html.parser"), False)]
+    if HTML_PARSER != "html.parser":
+        paths.append((f"{HTML_PARSER}, soup only", RecipeScraper(parser=HTML_PARSER), False))
+    paths.append((f"JSON-LD first ({HTML_PARSER})", RecipeScraper(), True))
+
+    baseline = None
+    print(f"{'path':>26} {'ms/page':>9} {'p95 ms':>9} {'speedup':>8} {'same ingredients':>17}")
+    for label, scraper, fast in paths:
+        timings, results = time_parser(lambda html: scraper.parse_recipe(html, fast=fast), fixtures, args.repeat)
+        if baseline is None:
+            baseline = (timings.mean(), results)
+        same = sum(result['ingredients'] == reference['ingredients'] for result, reference in zip(results, baseline[1]))
+        print(f"{label:>26} {timings.mean():>9.3f} {np.percentile(timings, 95):>9.3f} "
+              f"{baseline[0] / timings.mean():>8.1f} {same:>8}/{len(fixtures)}")
+
+    print(f"\n{'soup-only pool':>26} {'pages/s':>9} {'speedup':>9}")
+    single = None
+    for workers in args.workers:
+        throughput = pool_throughput(fixtures, workers, fast=False)
+        single = single or throughput
+        print(f"{str(workers) + ' processes':>26} {throughput:>9.1f} {throughput / single:>9.2f}")
+
+if __name__ == "__main__":
+    main()
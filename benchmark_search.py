@@ -0,0 +1,70 @@
+import argparse
+import time
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+from RecipeIndex import RecipeIndex
+
+def loop_search(user_embedding, all_recipes, top_k, threshold):
+    """The per-recipe scan SimilaritySearch used before RecipeIndex"""
+    user_embedding_np = np.array(user_embedding).reshape(1, -1)
+    similar_recipes = []
+    for recipe in all_recipes:
+        recipe_embedding_np = np.array(recipe['embedding']).reshape(1, -1)
+        similarity = float(cosine_similarity(user_embedding_np, recipe_embedding_np)[0][0])
+        if similarity >= threshold:
+            similar_recipes.append({'recipe': recipe, 'similarity_score': similarity})
+    similar_recipes.sort(key=lambda x: x['similarity_score'], reverse=True)
+    return similar_recipes[:top_k]
+
+def synthetic_matrix(num_recipes, dim, seed):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((num_recipes, dim), dtype=np.float32)
+
+def time_call(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+def run(sizes, dim, top_k, threshold, queries, loop_sample, seed):
+    rng = np.random.default_rng(seed + 1)
+    query_vectors = rng.standard_normal((queries, dim), dtype=np.float32)
+
+    print(f"{'recipes':>10} {'loop (s/query)':>16} {'index (s/query)':>16} {'speedup':>9}")
+    for size in sizes:
+        matrix = synthetic_matrix(size, dim, seed)
+        index = RecipeIndex.from_matrix([f"recipe::{i}" for i in range(size)], matrix)
+
+        index_time = np.mean([
+            time_call(lambda q=q: index.search(q, top_k=top_k, threshold=threshold), repeats=3)
+            for q in query_vectors
+        ])
+
+        # The loop is far too slow to run on a million recipes, so time it on a
+        # sample and scale linearly; its cost is strictly per-recipe.
+        sample_size = min(size, loop_sample)
+        sample = [{'recipe_id': i, 'embedding': row.tolist()} for i, row in enumerate(matrix[:sample_size])]
+        loop_time = time_call(lambda: loop_search(query_vectors[0], sample, top_k, threshold), repeats=1)
+        loop_time *= size / sample_size
+        note = "" if sample_size == size else " *"
+
+        print(f"{size:>10} {loop_time:>15.4f}{note or ' '} {index_time:>16.5f} {loop_time / index_time:>8.0f}x")
+
+    print("* extrapolated from a sample of", loop_sample, "recipes")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the recipe loop scan with RecipeIndex")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.1)
+    parser.add_argument('--queries', type=int, default=5)
+    parser.add_argument('--loop-sample', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    run(args.sizes, args.dim, args.top_k, args.threshold, args.queries, args.loop_sample, args.seed)
+
+if __name__ == "__main__":
+    main()
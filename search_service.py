@@ -0,0 +1,258 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+import numpy as np
+from aiohttp import web
+from DataManager import DataManager
+from ModelRegistry import ModelRegistry
+from SimilaritySearch import SimilaritySearch
+
+LATENCY_WINDOW = 2048
+
+class ServiceMetrics:
+    """Request counters, latency percentiles over a sliding window and a histogram of micro-batch sizes"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.requests = {}
+        self.errors = {}
+        self.latencies = {}
+        self.batch_sizes = {}
+
+    def observe(self, endpoint, seconds, error=False):
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        if error:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        self.latencies.setdefault(endpoint, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def observe_batch(self, size):
+        self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+
+    def snapshot(self):
+        latency = {}
+        for endpoint, window in self.latencies.items():
+            p50, p95, p99 = np.percentile(np.fromiter(window, dtype=np.float64), [50, 95, 99]) * 1000
+            latency[endpoint] = {'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3), 'p99_ms': round(p99, 3)}
+        batches = sum(self.batch_sizes.values())
+        batched = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'requests': dict(self.requests),
+            'errors': dict(self.errors),
+            'latency': latency,
+            'batches': batches,
+            'mean_batch_size': round(batched / batches, 2) if batches else 0.0,
+            'batch_size_histogram': {str(size): count for size, count in sorted(self.batch_sizes.items())},
+        }
+
+class MicroBatcher:
+    """Coalesces /search requests that arrive together into one find_similar_recipes_batch call
+
+    The first request in a batch waits at most `max_wait_ms` for others to join,
+    and a batch never exceeds `max_batch_size`. Requests are grouped by filters;
+    each group is scored once with the largest top_k and the lowest threshold in
+    it and every request then keeps its own cut of the results.
+    """
+
+    def __init__(self, engine, metrics, max_batch_size=64, max_wait_ms=5):
+        self.engine = engine
+        self.metrics = metrics
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self.worker = None
+
+    def start(self):
+        self.worker = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, ingredients, top_k, threshold, filters):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((ingredients, top_k, threshold, filters, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            self.metrics.observe_batch(len(batch))
+            groups = {}
+            for item in batch:
+                groups.setdefault(json.dumps(item[3], sort_keys=True), []).append(item)
+            for group in groups.values():
+                top_k = max(item[1] for item in group)
+                threshold = min(item[2] for item in group)
+                try:
+                    # Encoding and scoring are CPU-bound; keep the event loop free to accept requests
+                    results = await loop.run_in_executor(
+                        None, lambda: self.engine.find_similar_recipes_batch(
+                            [item[0] for item in group], top_k=top_k, threshold=threshold, filters=group[0][3],
+                            raise_errors=True))
+                except Exception as e:
+                    for item in group:
+                        if not item[4].done():
+                            item[4].set_exception(e)
+                    continue
+                for (_, item_top_k, item_threshold, _, future), hits in zip(group, results):
+                    if not future.done():
+                        future.set_result([hit for hit in hits
+                                           if hit['similarity_score'] >= item_threshold][:item_top_k])
+
+class SearchService:
+    """aiohttp app around one resident SimilaritySearch engine
+
+    The embedding model and the recipe index are loaded once at startup and
+    shared by every request; app.py reaches the same engine in-process through
+    ModelRegistry and SharedRecipeIndex, or over HTTP via SEARCH_SERVICE_URL.
+    With SEARCH_MODE=server, vector queries go one at a time to the Couchbase
+    vector index instead of the micro-batcher, and the recipe index is only
+    loaded for ingredient constraints and hybrid ranking.
+    """
+
+    def __init__(self, engine=None, max_batch_size=64, max_wait_ms=5):
+        self.engine = engine or SimilaritySearch()
+        self.metrics = ServiceMetrics()
+        self.batcher = MicroBatcher(self.engine, self.metrics, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+    def create_app(self):
+        app = web.Application()
+        app.router.add_post('/search', self.search)
+        app.router.add_post('/batch_search', self.batch_search)
+        app.router.add_get('/health', self.health)
+        app.router.add_get('/metrics', self.metrics_handler)
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        return app
+
+    async def on_startup(self, app):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, ModelRegistry.warm_up)
+        if self.server_mode:
+            if self.engine.vector_backend is None:
+                self.engine.vector_backend = await loop.run_in_executor(None, DataManager)
+        else:
+            await loop.run_in_executor(None, self.engine.get_recipe_index)
+        self.batcher.start()
+
+    async def on_cleanup(self, app):
+        await self.batcher.stop()
+
+    @property
+    def server_mode(self):
+        return self.engine.search_mode == "server"
+
+    @staticmethod
+    def _options(payload):
+        return (int(payload.get('top_k', 3)), float(payload.get('threshold', 0.1)), payload.get('filters') or {})
+
+    def _search_one(self, ingredients, top_k, threshold, filters, required, excluded, lexical_weight):
+        # A per-request SimilaritySearch keeps the query state private; the model and index are shared
+        # In server mode the recipe index is only loaded if the query needs it (see find_similar_recipes)
+        recipe_index = None if self.server_mode else self.engine.get_recipe_index()
+        search = SimilaritySearch(ingredients, recipe_index=recipe_index, search_mode=self.engine.search_mode,
+                                  vector_backend=self.engine.vector_backend)
+        search.get_user_embedding()
+        return search.find_similar_recipes(top_k=top_k, threshold=threshold, filters=filters,
+                                           required_ingredients=required, excluded_ingredients=excluded,
+                                           lexical_weight=lexical_weight, raise_errors=True)
+
+    async def _timed(self, endpoint, handler):
+        start = time.perf_counter()
+        error = False
+        try:
+            return await handler()
+        except (ValueError, KeyError, TypeError) as e:
+            error = True
+            return web.json_response({'error': str(e)}, status=400)
+        except Exception as e:
+            error = True
+            return web.json_response({'error': str(e)}, status=500)
+        finally:
+            self.metrics.observe(endpoint, time.perf_counter() - start, error=error)
+
+    async def search(self, request):
+        async def handle():
+            payload = await request.json()
+            ingredients = payload['ingredients']
+            top_k, threshold, filters = self._options(payload)
+            required = payload.get('required_ingredients')
+            excluded = payload.get('excluded_ingredients')
+            lexical_weight = float(payload.get('lexical_weight', 0.0))
+            if required or excluded or lexical_weight or self.server_mode:
+                # Ingredient constraints, hybrid ranking and server-side search are per-query, so they skip the batcher
+                results = await asyncio.get_running_loop().run_in_executor(
+                    None, self._search_one, ingredients, top_k, threshold, filters, required, excluded, lexical_weight)
+            else:
+                results = await self.batcher.submit(ingredients, top_k, threshold, filters)
+            return web.json_response({'results': results})
+        return await self._timed('search', handle)
+
+    async def batch_search(self, request):
+        async def handle():
+            payload = await request.json()
+            queries = payload['queries']
+            top_k, threshold, filters = self._options(payload)
+            if self.server_mode:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    None, lambda: [self._search_one(ingredients, top_k, threshold, filters, None, None, 0.0)
+                                   for ingredients in queries])
+            else:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    None, lambda: self.engine.find_similar_recipes_batch(queries, top_k=top_k, threshold=threshold,
+                                                                         filters=filters, raise_errors=True))
+            return web.json_response({'results': results})
+        return await self._timed('batch_search', handle)
+
+    async def health(self, request):
+        recipe_index = self.engine.recipe_index
+        recipes = len(recipe_index.index) if recipe_index is not None and recipe_index.index is not None else 0
+        return web.json_response({'status': 'ok' if recipes else 'loading', 'recipes': recipes,
+                                  'models': ModelRegistry.loaded_models()})
+
+    async def metrics_handler(self, request):
+        metrics = self.metrics.snapshot()
+        recipe_index = self.engine.recipe_index
+        if recipe_index is not None and recipe_index.index is not None:
+            metrics['recipes'] = len(recipe_index.index)
+        if self.engine.recipe_embedding.cache is not None:
+            metrics['embedding_cache'] = self.engine.recipe_embedding.cache.stats()
+        if self.engine.recipe_embedding.batcher is not None:
+            metrics['embedding_batcher'] = self.engine.recipe_embedding.batcher.stats()
+        return web.json_response(metrics)
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP search API with a resident model and recipe index")
+    parser.add_argument('--host', default=os.getenv("SEARCH_SERVICE_HOST", "0.0.0.0"))
+    parser.add_argument('--port', type=int, default=int(os.getenv("SEARCH_SERVICE_PORT", "8080")))
+    parser.add_argument('--max-batch-size', type=int, default=64, help="most /search requests coalesced into one pass")
+    parser.add_argument('--max-wait-ms', type=float, default=5, help="longest a request waits for others to join")
+    args = parser.parse_args()
+
+    service = SearchService(max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+    web.run_app(service.create_app(), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()